@@ -0,0 +1,394 @@
+"""
+Headless HTTP API for transcription, for programmatic clients that should not
+go through the Streamlit dashboard.
+
+Uses only the standard library HTTP server, the shared transcription service
+(warm worker processes and the transcript cache) and the database layer.
+
+Endpoints:
+    POST /transcriptions            Upload audio as the request body
+                                    (Content-Length or chunked). Returns 202
+                                    with a job id, or 503 if the queue is
+                                    full. ?user_id=N saves the result to that
+                                    user's history (see Authentication);
+                                    ?stream=1 recognizes in this request and
+                                    streams NDJSON events back instead,
+                                    holding a queue slot while it runs.
+    GET  /transcriptions/<id>       Job status and, once done, the result.
+                                    ?wait=S long-polls up to S seconds;
+                                    ?format=srt|vtt returns captions.
+    DELETE /transcriptions/<id>     Cancel a job that has not started.
+    GET  /health                    Queue statistics.
+
+Authentication:
+    Anyone who can reach the server may transcribe, so bind it to localhost
+    or a trusted network. Saving to a user's history writes to that user's
+    account, so ?user_id is only accepted with an "Authorization: Bearer
+    <token>" header matching the token given with --token or
+    $TRANSCRIPTION_API_TOKEN; without a configured token it is refused.
+
+Usage:
+    python api_server.py --port 8502 --model /path/to/model
+    TRANSCRIPTION_API_TOKEN=secret python api_server.py
+"""
+import argparse
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from database import save_session
+from recognizer_pool import get_recognizer_pool
+from speech_recognition import stream_transcription, MODEL_PATH
+from transcript import Transcript
+from transcription_service import get_transcription_service, QueueFullError
+
+# Largest accepted upload
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+# Longest a client may block in a single long-poll
+MAX_WAIT_SECONDS = 60
+READ_BLOCK = 64 * 1024
+
+
+class RequestError(Exception):
+    """Raised by request handling to send an error response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _iter_chunked(rfile):
+    """Yield the payload of a chunked transfer-encoded request body."""
+    while True:
+        line = rfile.readline(1024)
+        try:
+            size = int(line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            raise RequestError(400, "Malformed chunk header")
+        if size == 0:
+            # Skip trailers up to the blank line
+            while rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                pass
+            return
+        remaining = size
+        while remaining:
+            data = rfile.read(min(remaining, READ_BLOCK))
+            if not data:
+                raise RequestError(400, "Truncated chunk")
+            remaining -= len(data)
+            yield data
+        rfile.readline(1024)
+
+
+def _iter_body(handler):
+    """Yield the request body in blocks, without holding all of it in memory."""
+    if "chunked" in handler.headers.get("Transfer-Encoding", "").lower():
+        yield from _iter_chunked(handler.rfile)
+        return
+
+    length = handler.headers.get("Content-Length")
+    if length is None:
+        raise RequestError(411, "Content-Length or chunked encoding required")
+    remaining = int(length)
+    if remaining > MAX_UPLOAD_BYTES:
+        raise RequestError(413, "Upload too large")
+    while remaining:
+        data = handler.rfile.read(min(remaining, READ_BLOCK))
+        if not data:
+            raise RequestError(400, "Truncated body")
+        remaining -= len(data)
+        yield data
+
+
+class TranscriptionAPI:
+    """State shared by all request handlers of one server."""
+
+    def __init__(self, model_path=MODEL_PATH, upload_dir=None, token=None):
+        self.model_path = model_path
+        self.token = token
+        self.service = get_transcription_service(model_path)
+        self.upload_dir = upload_dir or tempfile.mkdtemp(prefix="transcription-uploads-")
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def authorized(self, header):
+        """Whether an Authorization header carries the server's token."""
+        if not self.token or not header or not header.startswith("Bearer "):
+            return False
+        return hmac.compare_digest(header[len("Bearer "):].encode("utf-8"),
+                                   self.token.encode("utf-8"))
+
+    def save_upload(self, body):
+        """Write an uploaded body to a new file and return its path."""
+        with self._lock:
+            self._counter += 1
+            index = self._counter
+        path = os.path.join(self.upload_dir, f"upload_{os.getpid()}_{index}")
+
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                for data in body:
+                    size += len(data)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise RequestError(413, "Upload too large")
+                    f.write(data)
+        except BaseException:
+            _remove(path)
+            raise
+        if size == 0:
+            _remove(path)
+            raise RequestError(400, "Empty upload")
+        return path
+
+    def submit(self, path, user_id=None):
+        """Queue an uploaded file, saving the result for user_id if given."""
+        try:
+            job = self.service.submit_segmented(path)
+        except QueueFullError:
+            _remove(path)
+            raise
+
+        def finished(job):
+            _remove(path)
+            if user_id is not None and job.status() == "done" and job.result():
+                try:
+                    save_session(user_id, job.result(), transcript=job.transcript())
+                except Exception as e:
+                    print(f"Error saving transcript for job {job.id}: {e}")
+
+        job.add_done_callback(finished)
+        return job
+
+    def close(self):
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _job_body(job):
+    body = {"id": job.id, "status": job.status()}
+    if body["status"] == "done":
+        transcript = job.transcript()
+        body["text"] = transcript.text
+        body["transcript"] = transcript.to_dict()
+        if not transcript.text:
+            body["message"] = "No speech recognized"
+    elif body["status"] == "failed":
+        error = job.error()
+        body["error"] = str(error) if error is not None else "Transcription failed"
+    return body
+
+
+class TranscriptionRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the TranscriptionAPI attached to the server."""
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_text(self, status, text, content_type):
+        payload = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, handler):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            handler(parts, params)
+        except RequestError as e:
+            self.close_connection = True
+            self._send_json(e.status, {"error": str(e)})
+        except QueueFullError as e:
+            # The body may not have been read
+            self.close_connection = True
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "5"})
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            print(f"Error handling {self.command} {self.path}: {e}")
+            self.close_connection = True
+            self._send_json(500, {"error": "Internal server error"})
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def do_DELETE(self):
+        self._dispatch(self._delete)
+
+    def _get(self, parts, params):
+        if parts == ["health"]:
+            stats = self.api.service.stats()
+            # Streaming requests recognize in this process with pooled recognizers
+            stats["recognizers"] = get_recognizer_pool().stats()
+            self._send_json(200, stats)
+            return
+        job = self._find_job(parts)
+
+        try:
+            wait = min(float(params.get("wait", 0) or 0), MAX_WAIT_SECONDS)
+        except ValueError:
+            raise RequestError(400, "wait must be a number of seconds")
+        if wait > 0 and not job.done():
+            try:
+                job.transcript(timeout=wait)
+            except Exception:
+                # Timed out or failed; either way report the current status
+                pass
+
+        caption_format = params.get("format")
+        if caption_format in ("srt", "vtt"):
+            if job.status() != "done":
+                raise RequestError(409, f"Job is {job.status()}")
+            transcript = job.transcript()
+            if caption_format == "srt":
+                self._send_text(200, transcript.to_srt(), "application/x-subrip")
+            else:
+                self._send_text(200, transcript.to_vtt(), "text/vtt")
+            return
+        body = _job_body(job)
+        self._send_json(500 if body["status"] == "failed" else 200, body)
+
+    def _post(self, parts, params):
+        if parts != ["transcriptions"]:
+            raise RequestError(404, "Not found")
+        try:
+            user_id = int(params["user_id"]) if params.get("user_id") else None
+        except ValueError:
+            raise RequestError(400, "user_id must be an integer")
+        if user_id is not None and not self.api.authorized(self.headers.get("Authorization")):
+            raise RequestError(403, "A valid token is required to save to a user's history")
+
+        service = self.api.service
+        if params.get("stream") in ("1", "true"):
+            with service.reserve():
+                self._stream(self.api.save_upload(_iter_body(self)), user_id)
+            return
+
+        # Refuse before reading the upload rather than after
+        if not service.has_capacity():
+            raise QueueFullError(f"Transcription queue is full ({service.max_pending} jobs pending)")
+        path = self.api.save_upload(_iter_body(self))
+        job = self.api.submit(path, user_id)
+        self._send_json(202, {"id": job.id, "status": job.status()},
+                        {"Location": f"/transcriptions/{job.id}"})
+
+    def _delete(self, parts, params):
+        job = self._find_job(parts)
+        if not job.cancel():
+            raise RequestError(409, f"Job is {job.status()}")
+        self._send_json(200, {"id": job.id, "status": job.status()})
+
+    def _find_job(self, parts):
+        if len(parts) != 2 or parts[0] != "transcriptions":
+            raise RequestError(404, "Not found")
+        job = self.api.service.get_job(parts[1])
+        if job is None:
+            raise RequestError(404, "Unknown job")
+        return job
+
+    def _stream(self, path, user_id):
+        """Recognize in this thread and send each event as a line of NDJSON."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        transcript = Transcript()
+        events = stream_transcription(path, self.api.model_path)
+        try:
+            for event in events:
+                if event.kind == "final":
+                    transcript.add_result({"text": event.text, "result": event.words})
+                self._write_chunk(json.dumps(event._asdict()).encode("utf-8") + b"\n")
+            if user_id is not None and transcript.text:
+                save_session(user_id, transcript.text, transcript=transcript)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away; stop recognizing
+            self.close_connection = True
+            return
+        except Exception as e:
+            self._write_chunk(json.dumps({"kind": "error", "text": str(e)}).encode("utf-8") + b"\n")
+        finally:
+            events.close()
+            _remove(path)
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # Keep request logs off stderr unless the server was started verbose
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class TranscriptionServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying a TranscriptionAPI."""
+
+    daemon_threads = True
+
+    def __init__(self, address, api, verbose=False):
+        super().__init__(address, TranscriptionRequestHandler)
+        self.api = api
+        self.verbose = verbose
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--model", default=os.environ.get("VOSK_MODEL_PATH", MODEL_PATH),
+                        help="Vosk model directory (default: $VOSK_MODEL_PATH)")
+    parser.add_argument("--token", default=os.environ.get("TRANSCRIPTION_API_TOKEN"),
+                        help="Bearer token required for ?user_id "
+                             "(default: $TRANSCRIPTION_API_TOKEN)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    api = TranscriptionAPI(model_path=args.model, token=args.token)
+    server = TranscriptionServer((args.host, args.port), api, verbose=args.verbose)
+    print(f"Serving transcription API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
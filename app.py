@@ -1,35 +1,12 @@
 import streamlit as st
-import sqlite3
-from datetime import datetime
-from speech_recognition import AudioRecorder, convert_audio_to_text, check_microphone
+from transcript import Transcript
+from database import create_user, find_user, save_session, get_user_sessions, search_sessions
 import os
+import re
 
-# Database setup
-conn = sqlite3.connect('user_data.db', check_same_thread=False)
-c = conn.cursor()
-
-# Create tables
-c.execute('''
-CREATE TABLE IF NOT EXISTS user_main (
-    id INTEGER PRIMARY KEY,
-    username TEXT,
-    email TEXT,
-    password TEXT,
-    dob TEXT,
-    sex TEXT,
-    height REAL,
-    weight REAL,
-    nationality TEXT
-)''')
-
-c.execute('''
-CREATE TABLE IF NOT EXISTS user_sessions (
-    session_id INTEGER PRIMARY KEY,
-    user_id INTEGER,
-    input_text TEXT,
-    retrieved_data TEXT,
-    FOREIGN KEY (user_id) REFERENCES user_main (id)
-)''')
+# The audio stack (pyaudio, vosk, pydub, NumPy and the worker pool) is
+# imported inside user_dashboard(), so the Login and Signup pages start
+# without loading it. Python caches the modules after the first import.
 
 # Signup function
 def signup():
@@ -46,9 +23,7 @@ def signup():
 
     if st.button("Sign Up"):
         if password == confirm_password:
-            c.execute("INSERT INTO user_main (username, email, password, dob, sex, height, weight, nationality) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                      (username, email, password, dob, sex, height, weight, nationality))
-            conn.commit()
+            create_user(username, email, password, dob, sex, height, weight, nationality)
             st.success("Account created successfully! Please log in.")
         else:
             st.error("Passwords do not match")
@@ -60,29 +35,113 @@ def login():
     password = st.text_input("Password", type="password")
 
     if st.button("Login"):
-        user = c.execute("SELECT * FROM user_main WHERE email = ? AND password = ?", (email, password)).fetchone()
+        user = find_user(email, password)
         if user:
             st.success("Logged in successfully")
             st.session_state['user_id'] = user[0]  # Store user ID in session state
         else:
             st.error("Invalid credentials")
 
+def store_transcript(text, transcript=None, audio_file=None):
+    """
+    Show text in the transcript area and add it to the user's history. The
+    audio it was transcribed from is archived in the background, so it can
+    be replayed or transcribed again after the session's workspace is
+    cleared.
+    """
+    st.session_state.transcribed_text = text
+    st.session_state.transcript = transcript
+    session_id = save_session(st.session_state['user_id'], text, transcript=transcript)
+    if audio_file and os.path.exists(audio_file):
+        from archive import archive_session_recording
+        from async_transcription import get_executor
+
+        workspace = st.session_state.workspace
+        workspace.lease(audio_file)
+        future = get_executor().submit(archive_session_recording, audio_file, session_id)
+        future.add_done_callback(lambda _: workspace.release(audio_file))
+    # Start the history view again from the newest page
+    st.session_state.history_rows = None
+
+
+# Markers SQLite places around matched terms; they cannot occur in typed or
+# transcribed text, so they survive escaping and become bold afterwards
+_MATCH_START, _MATCH_END = "\x02", "\x03"
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|<>~$])")
+
+
+def render_snippet(snippet):
+    """Escape a search snippet for st.markdown and bold its matched terms."""
+    escaped = _MARKDOWN_SPECIAL.sub(r"\\\1", snippet)
+    return escaped.replace(_MATCH_START, "**").replace(_MATCH_END, "**")
+
+
+def load_more_history(user_id, page_size):
+    rows, cursor = get_user_sessions(user_id, limit=page_size,
+                                     before=st.session_state.history_cursor)
+    st.session_state.history_rows.extend(rows)
+    st.session_state.history_cursor = cursor
+
+
+def show_history(user_id, page_size=20):
+    """Render the user's history one page at a time, loading more on request."""
+    if st.session_state.get('history_rows') is None:
+        rows, cursor = get_user_sessions(user_id, limit=page_size)
+        st.session_state.history_rows = rows
+        st.session_state.history_cursor = cursor
+
+    if not st.session_state.history_rows:
+        st.info("No saved transcripts yet")
+        return
+
+    for session_id, text, created_at in st.session_state.history_rows:
+        with st.expander(f"Saved {created_at}"):
+            st.write(text)
+
+    if st.session_state.history_cursor is not None:
+        # Runs as a callback so the new page shows up on this click
+        st.button("Load more", on_click=load_more_history, args=(user_id, page_size))
+
+
 # User dashboard with speech-to-text functionality
 def user_dashboard():
+    from speech_recognition import AudioRecorder, check_microphone, stream_transcription, MODEL_PATH
+    from model_registry import default_registry, preload_models_in_background
+    from audio_devices import get_audio_host
+    from workspace import get_workspace_manager, WorkspaceQuotaError
+    from transcription_service import get_transcription_service, QueueFullError
+
+    # Load the speech model once per process while the user looks at the page
+    preload_models_in_background(MODEL_PATH)
+
     st.title("User Dashboard")
+    if not default_registry.is_loaded(MODEL_PATH):
+        st.caption("Loading the speech model in the background; "
+                   "the first transcription waits for it to finish.")
 
     if 'user_id' in st.session_state:
         st.write(f"Welcome, User ID: {st.session_state['user_id']}")
 
         # Initialize session state variables if they don't exist
+        if 'workspace' not in st.session_state:
+            # Private scratch directory; the janitor removes it once abandoned
+            st.session_state.workspace = get_workspace_manager().create()
         if 'audio_recorder' not in st.session_state:
-            st.session_state.audio_recorder = AudioRecorder()
+            st.session_state.audio_recorder = AudioRecorder(workspace=st.session_state.workspace)
+        if 'uploaded_file_id' not in st.session_state:
+            st.session_state.uploaded_file_id = None
         if 'recording' not in st.session_state:
             st.session_state.recording = False
         if 'audio_file' not in st.session_state:
             st.session_state.audio_file = None
         if 'transcribed_text' not in st.session_state:
             st.session_state.transcribed_text = ""
+        if 'transcription_job_id' not in st.session_state:
+            st.session_state.transcription_job_id = None
+        if 'stream_audio_file' not in st.session_state:
+            st.session_state.stream_audio_file = None
+        if 'transcript' not in st.session_state:
+            st.session_state.transcript = None
 
         # Check if a microphone is available
         mic_available, mic_message = check_microphone()
@@ -90,27 +149,46 @@ def user_dashboard():
             st.error(mic_message)
         else:
             st.success(mic_message)
+            # Device list comes from the cached inventory, not a fresh PortAudio scan
+            devices = get_audio_host().input_devices()
+            default = next((i for i, d in enumerate(devices) if d.is_default), 0)
+            device = st.selectbox("Microphone", devices, index=default,
+                                  format_func=lambda d: f"{d.name} ({d.default_sample_rate} Hz)",
+                                  disabled=st.session_state.recording)
+            if device is not None and not st.session_state.recording:
+                st.session_state.audio_recorder.input_device = device.index
+        # Runs as a callback so the new inventory shows up on this click
+        st.button("🔄 Rescan Microphones", on_click=check_microphone, kwargs={"max_age": 0})
 
         # Manual text input area
         input_text = st.text_area("Manual Input Text", "", height=100)
         if st.button("Save Input Text"):
             if input_text.strip():
-                st.session_state.transcribed_text = input_text.strip()
+                store_transcript(input_text.strip())
                 st.success("Input text saved!")
 
         # File uploader for audio files
         uploaded_audio_file = st.file_uploader("Upload an Audio File", type=["wav", "mp3"])
-        if uploaded_audio_file is not None:
-            # Save the uploaded file for processing
+        if uploaded_audio_file is not None and \
+                uploaded_audio_file.file_id != st.session_state.uploaded_file_id:
+            # Save each upload once, not again on every rerun. The file is
+            # copied in chunks and not rewritten if this session already stored it.
             try:
-                file_path = f"uploaded_{uploaded_audio_file.name}"
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_audio_file.getbuffer())
-                st.session_state.audio_file = file_path
+                st.session_state.audio_file = st.session_state.workspace.save_upload(
+                    uploaded_audio_file.name, uploaded_audio_file, uploaded_audio_file.size)
+                st.session_state.uploaded_file_id = uploaded_audio_file.file_id
                 st.success("Audio file uploaded successfully.")
+            except WorkspaceQuotaError as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"Failed to save the audio file: {e}")
 
+        live_transcription = st.checkbox("Transcribe live while recording", value=True)
+        progressive = st.checkbox("Show text as it is recognized", value=False)
+        split_long = st.checkbox("Split long files across workers", value=False,
+                                 help="Faster for long audio: the file is cut at pauses "
+                                      "and the parts are recognized in parallel")
+
         # Form for user actions: recording, stopping, and transcribing
         with st.form("audio_form"):
             col1, col2 = st.columns(2)
@@ -119,42 +197,111 @@ def user_dashboard():
             with col1:
                 if not st.session_state.recording:
                     if st.form_submit_button("🎤 Start Recording"):
-                        if st.session_state.audio_recorder.start_recording():
+                        if st.session_state.audio_recorder.start_recording(
+                                live_transcription=live_transcription):
                             st.session_state.recording = True
                         else:
                             st.error(f"Failed to start recording: {st.session_state.audio_recorder.error}")
                 else:
                     if st.form_submit_button("⏹️ Stop Recording"):
                         st.session_state.recording = False
-                        st.session_state.audio_recorder.stop_recording()
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        st.session_state.audio_file = f"recording_{timestamp}.wav"
+                        # Waits for the recording thread so the WAV exists before it is used
+                        st.session_state.audio_recorder.stop_recording(timeout=5)
+                        st.session_state.audio_file = st.session_state.audio_recorder.filename
+                        # The live recognizer only has the last chunk left to finish
+                        live_text = st.session_state.audio_recorder.wait_for_transcript(timeout=5)
+                        if live_text:
+                            store_transcript(live_text, st.session_state.audio_recorder.transcript,
+                                             st.session_state.audio_file)
+                            st.success("Transcription complete!")
 
             # Transcribe button for uploaded or recorded audio
             with col2:
                 if st.session_state.audio_file and os.path.exists(st.session_state.audio_file):
                     if st.form_submit_button("📝 Transcribe Audio"):
-                        with st.spinner("Transcribing..."):
-                            transcribed_text = convert_audio_to_text(
-                                st.session_state.audio_file
-                            )
-                            if transcribed_text:
-                                st.session_state.transcribed_text = transcribed_text
-                                st.success("Transcription complete!")
-                            else:
-                                st.error("Transcription failed")
+                        if progressive:
+                            # Recognized below the form so text can appear as it comes
+                            st.session_state.stream_audio_file = st.session_state.audio_file
+                        else:
+                            # Hand the file to the worker pool instead of blocking this rerun
+                            service = get_transcription_service()
+                            submit = service.submit_segmented if split_long else service.submit
+                            audio_file = st.session_state.audio_file
+                            workspace = st.session_state.workspace
+                            # Kept from the janitor until the job is finished
+                            workspace.lease(audio_file)
+                            try:
+                                job = submit(audio_file)
+                                job.add_done_callback(lambda _: workspace.release(audio_file))
+                                st.session_state.transcription_job_id = job.id
+                            except QueueFullError:
+                                workspace.release(audio_file)
+                                st.error("The server is busy transcribing other files. Please try again shortly.")
 
             # Clear button
             if st.form_submit_button("🗑️ Clear"):
                 st.session_state.transcribed_text = ""
+                st.session_state.transcript = None
                 st.session_state.audio_file = None
-                # Clean up audio files
-                for file in os.listdir():
-                    if file.startswith("recording_") or file.startswith("uploaded_"):
-                        try:
-                            os.remove(file)
-                        except Exception as e:
-                            st.error(f"Error deleting file {file}: {e}")
+                # Only this session's recordings and uploads are deleted
+                try:
+                    st.session_state.workspace.clear()
+                except Exception as e:
+                    st.error(f"Error deleting audio files: {e}")
+
+        if st.session_state.recording and st.session_state.audio_recorder.max_duration_reached:
+            st.warning("Maximum recording duration reached. Press Stop Recording to keep the audio.")
+
+        # Show partial results while the user is still speaking
+        if st.session_state.recording and st.session_state.audio_recorder.recognizer is not None:
+            final_text, partial_text = st.session_state.audio_recorder.get_live_transcript()
+            st.info(f"{final_text} {partial_text}".strip() or "Listening...")
+            st.button("🔄 Refresh Live Text")
+
+        # Recognize in this rerun, showing each utterance as soon as it is final
+        if st.session_state.stream_audio_file:
+            audio_file = st.session_state.stream_audio_file
+            st.session_state.stream_audio_file = None
+            placeholder = st.empty()
+            transcript = Transcript()
+            st.session_state.workspace.lease(audio_file)
+            try:
+                for event in stream_transcription(audio_file, model_path=MODEL_PATH):
+                    if event.kind == "final":
+                        transcript.add_result({"text": event.text, "result": event.words})
+                        placeholder.info(transcript.text)
+                    else:
+                        placeholder.info(f"{transcript.text} {event.text}".strip())
+                placeholder.empty()
+                if transcript.text:
+                    store_transcript(transcript.text, transcript, audio_file)
+                    st.success("Transcription complete!")
+                else:
+                    st.warning("No speech was detected in the audio")
+            except Exception as e:
+                placeholder.empty()
+                st.error(f"Transcription failed: {e}")
+            finally:
+                st.session_state.workspace.release(audio_file)
+
+        # Poll the background transcription job, if any
+        if st.session_state.transcription_job_id:
+            job = get_transcription_service().get_job(st.session_state.transcription_job_id)
+            if job is None:
+                st.session_state.transcription_job_id = None
+            elif job.status() == "done":
+                st.session_state.transcription_job_id = None
+                if job.result():
+                    store_transcript(job.result(), job.transcript(), st.session_state.audio_file)
+                    st.success("Transcription complete!")
+                else:
+                    st.warning("No speech was detected in the audio")
+            elif job.status() in ("failed", "cancelled"):
+                st.session_state.transcription_job_id = None
+                st.error("Transcription failed")
+            else:
+                st.info(f"Transcription {job.status()}...")
+                st.button("🔄 Refresh Status")
 
         # Display the transcribed text in a text area
         st.text_area("Transcribed Text",
@@ -162,6 +309,31 @@ def user_dashboard():
                      height=200,
                      key="transcript_area")
 
+        # Captions are built from the stored word timings, no re-recognition needed
+        if st.session_state.transcript is not None and len(st.session_state.transcript):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("⬇️ Captions (SRT)", st.session_state.transcript.to_srt(),
+                                   file_name="transcript.srt", mime="application/x-subrip")
+            with col2:
+                st.download_button("⬇️ Captions (VTT)", st.session_state.transcript.to_vtt(),
+                                   file_name="transcript.vtt", mime="text/vtt")
+
+        # Ranked full-text search over saved transcripts
+        query = st.text_input("🔍 Search saved transcripts")
+        if query.strip():
+            results = search_sessions(st.session_state['user_id'], query,
+                                      highlight=(_MATCH_START, _MATCH_END))
+            if results:
+                for session_id, created_at, snippet, _ in results:
+                    st.markdown(f"**{created_at}** — {render_snippet(snippet)}")
+            else:
+                st.info("No matching transcripts")
+
+        # History is only queried when the user asks to see it
+        if st.checkbox("Show saved transcripts"):
+            show_history(st.session_state['user_id'])
+
         # Add some usage instructions
         with st.expander("ℹ️ Instructions"):
             st.markdown("""
@@ -181,6 +353,3 @@ if 'user_id' not in st.session_state:
         login()
 else:
     user_dashboard()
-
-# Close the database connection when done
-conn.close()
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from speech_recognition import AudioRecorder, stream_transcription, MODEL_PATH
+from transcript import Transcript
+from transcript_cache import CacheEntry
+
+_DONE = object()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the shared thread pool that runs blocking decode and recognition
+    steps. Vosk releases the GIL while decoding, so threads run in parallel.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                           thread_name_prefix="async-transcription")
+        return _executor
+
+
+async def stream(source, model_path=MODEL_PATH, partial_results=True, executor=None):
+    """
+    Async iterator over the results of stream_transcription().
+
+    Each step of the recognizer runs on the executor and control returns to
+    the event loop between steps, so no thread is held by a session while it
+    waits and many sessions can share a small pool. Cancelling the consuming
+    task or leaving the loop early stops recognition after the current step.
+
+    Args:
+        source: Path, binary stream or iterable of PCM blocks, as for
+            stream_transcription().
+        model_path (str): Path to the Vosk model directory.
+        partial_results (bool): Also yield partial hypotheses.
+        executor (Executor): Where blocking steps run. Defaults to
+            get_executor().
+
+    Yields:
+        TranscriptionEvent: Partial and final results in order.
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or get_executor()
+    cancel_event = threading.Event()
+    results = stream_transcription(source, model_path, partial_results=partial_results,
+                                   cancel_event=cancel_event)
+    step = None
+    try:
+        while True:
+            step = loop.run_in_executor(executor, next, results, _DONE)
+            event = await step
+            step = None
+            if event is _DONE:
+                break
+            yield event
+    finally:
+        cancel_event.set()
+        if step is not None and not step.done():
+            # A step is still running on the executor; close the generator
+            # once it returns instead of blocking the event loop here
+            step.add_done_callback(lambda _: executor.submit(results.close))
+        else:
+            executor.submit(results.close)
+
+
+async def transcribe(audio_file_path, model_path=MODEL_PATH, timeout=None, use_cache=True,
+                     executor=None):
+    """
+    Transcribe an audio file without blocking the event loop.
+
+    Args:
+        audio_file_path (str): Path to the audio file.
+        model_path (str): Path to the Vosk model directory.
+        timeout (float): Give up after this many seconds. None waits as
+            long as it takes.
+        use_cache (bool): Share results with transcribe_audio() through the
+            transcript cache.
+        executor (Executor): Where blocking steps run. Defaults to
+            get_executor().
+
+    Returns:
+        Transcript: The structured transcript, or None if transcription fails.
+
+    Raises:
+        asyncio.TimeoutError: If timeout elapsed first. Recognition is
+            stopped as well.
+    """
+    return await asyncio.wait_for(
+        _transcribe(audio_file_path, model_path, use_cache, executor or get_executor()),
+        timeout)
+
+
+async def _transcribe(audio_file_path, model_path, use_cache, executor):
+    loop = asyncio.get_running_loop()
+    try:
+        entry = None
+        if use_cache:
+            # Same cache entry as transcribe_audio(), built and read off the loop
+            entry = await loop.run_in_executor(executor, CacheEntry, audio_file_path, model_path)
+            cached = await loop.run_in_executor(executor, entry.load)
+            if cached is not None:
+                return cached
+
+        transcript = Transcript()
+        async for event in stream(audio_file_path, model_path, partial_results=False,
+                                  executor=executor):
+            transcript.add_result({"text": event.text, "result": event.words})
+
+        if entry is not None:
+            await loop.run_in_executor(executor, entry.store, transcript)
+        return transcript
+
+    except Exception as e:
+        print(f"Error during transcription: {e}")
+        return None
+
+
+async def record(duration=None, stop_event=None, auto_stop_silence=None,
+                 live_transcription=False, model_path=MODEL_PATH, poll_interval=0.1):
+    """
+    Record from the microphone until duration elapses, stop_event is set,
+    silence triggers auto-stop or the recorder's maximum duration is reached.
+
+    Capture runs on the recorder's own thread; this coroutine only polls it,
+    so waiting costs the event loop nothing. Cancelling the task stops the
+    recording and keeps what was captured so far.
+
+    Args:
+        duration (float): Seconds to record, or None for no fixed length.
+        stop_event (asyncio.Event): Stop recording once this is set.
+        auto_stop_silence (float): As for AudioRecorder.
+        live_transcription (bool): Recognize while recording.
+        model_path (str): Vosk model directory for live transcription.
+        poll_interval (float): Seconds between checks of the recorder.
+
+    Returns:
+        AudioRecorder: The stopped recorder. Its filename attribute names
+        the saved WAV and, with live_transcription, its transcript holds
+        the recognized text.
+    """
+    loop = asyncio.get_running_loop()
+    recorder = AudioRecorder(auto_stop_silence=auto_stop_silence)
+    if not recorder.start_recording(live_transcription=live_transcription,
+                                    model_path=model_path):
+        raise RuntimeError(f"Failed to start recording: {recorder.error}")
+
+    deadline = None if duration is None else loop.time() + duration
+    try:
+        while recorder.is_recording:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if deadline is not None and loop.time() >= deadline:
+                break
+            await asyncio.sleep(poll_interval)
+    finally:
+        # Stopping waits for the WAV to be written, so do it off the loop
+        await asyncio.shield(loop.run_in_executor(None, recorder.stop_recording))
+
+    if live_transcription:
+        await loop.run_in_executor(None, recorder.wait_for_transcript)
+    return recorder
@@ -0,0 +1,150 @@
+import math
+import wave
+from collections import deque
+
+
+class PCMBuffer:
+    """
+    Bounded PCM store made of fixed-size preallocated bytearray blocks.
+
+    Blocks are allocated on demand up to max_seconds worth of audio, so a short
+    recording only uses a little memory while a forgotten one can never grow
+    past the cap. When the cap is reached the buffer either keeps the most
+    recent audio (overwrite=True, ring behaviour) or keeps the beginning and
+    drops new data (overwrite=False). Frames lost either way are counted in
+    frames_dropped.
+
+    Exports hand out memoryviews of the blocks, so writing a WAV or feeding a
+    recognizer never joins the audio into one large bytes object.
+    """
+
+    def __init__(self, max_seconds=600, sample_rate=16000, channels=1, sample_width=2,
+                 block_seconds=1.0, overwrite=False):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        self.overwrite = overwrite
+
+        self.block_bytes = max(1, int(sample_rate * block_seconds)) * self.frame_bytes
+        max_bytes = int(max_seconds * sample_rate) * self.frame_bytes
+        self.max_blocks = max(1, math.ceil(max_bytes / self.block_bytes))
+
+        self._blocks = deque()
+        self._spare = []
+        self._tail_fill = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+
+    @property
+    def max_seconds(self):
+        return self.max_blocks * self.block_bytes / self.frame_bytes / self.sample_rate
+
+    @property
+    def size_bytes(self):
+        if not self._blocks:
+            return 0
+        return (len(self._blocks) - 1) * self.block_bytes + self._tail_fill
+
+    @property
+    def frame_count(self):
+        return self.size_bytes // self.frame_bytes
+
+    @property
+    def duration_seconds(self):
+        return self.frame_count / self.sample_rate
+
+    @property
+    def is_full(self):
+        return len(self._blocks) == self.max_blocks and self._tail_fill == self.block_bytes
+
+    def _next_block(self):
+        """Return an empty block to append, or None if data must be dropped."""
+        if len(self._blocks) < self.max_blocks:
+            return self._spare.pop() if self._spare else bytearray(self.block_bytes)
+        if not self.overwrite:
+            return None
+        # Recycle the oldest block; its audio is lost
+        oldest = self._blocks.popleft()
+        self.frames_dropped += self.block_bytes // self.frame_bytes
+        return oldest
+
+    def write(self, data):
+        """
+        Append raw PCM data.
+
+        Args:
+            data (bytes-like): Whole frames of PCM audio.
+
+        Returns:
+            int: Number of frames stored (less than written if the buffer is
+            full and overwrite is False).
+        """
+        src = memoryview(data).cast("B")
+        total = len(src) - len(src) % self.frame_bytes
+        offset = 0
+
+        while offset < total:
+            if not self._blocks or self._tail_fill == self.block_bytes:
+                block = self._next_block()
+                if block is None:
+                    break
+                self._blocks.append(block)
+                self._tail_fill = 0
+
+            block = self._blocks[-1]
+            n = min(self.block_bytes - self._tail_fill, total - offset)
+            block[self._tail_fill:self._tail_fill + n] = src[offset:offset + n]
+            self._tail_fill += n
+            offset += n
+
+        stored = offset // self.frame_bytes
+        self.frames_written += stored
+        self.frames_dropped += (total - offset) // self.frame_bytes
+        return stored
+
+    def views(self):
+        """
+        Return the buffered audio as memoryviews in chronological order.
+        The views share memory with the buffer and are invalidated by write().
+        """
+        result = [memoryview(block) for block in self._blocks]
+        if result:
+            result[-1] = result[-1][:self._tail_fill]
+        return result
+
+    def iter_chunks(self, chunk_frames):
+        """
+        Yield memoryview slices of at most chunk_frames frames, e.g. for
+        AcceptWaveform. Slices never span two blocks, so nothing is copied.
+        """
+        chunk_bytes = chunk_frames * self.frame_bytes
+        for view in self.views():
+            for offset in range(0, len(view), chunk_bytes):
+                yield view[offset:offset + chunk_bytes]
+
+    def write_wav(self, filename):
+        """Write the buffered audio to a WAV file without joining it first."""
+        with wave.open(filename, "wb") as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(self.sample_width)
+            wf.setframerate(self.sample_rate)
+            for view in self.views():
+                wf.writeframes(view)
+
+    def clear(self):
+        """Empty the buffer, keeping allocated blocks for reuse."""
+        self._spare.extend(self._blocks)
+        self._blocks.clear()
+        self._tail_fill = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+
+    def stats(self):
+        return {
+            "frames": self.frame_count,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "allocated_bytes": (len(self._blocks) + len(self._spare)) * self.block_bytes,
+            "max_seconds": self.max_seconds,
+        }
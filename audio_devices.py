@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import namedtuple
+
+# Value of pyaudio.paInt16, so callers need not import pyaudio for it
+PA_INT16 = 8
+
+# Seconds a device scan stays valid
+INVENTORY_TTL = 30.0
+
+AudioDevice = namedtuple("AudioDevice", ["index", "name", "max_input_channels",
+                                         "default_sample_rate", "is_default"])
+
+
+def _default_backend():
+    import pyaudio
+
+    return pyaudio.PyAudio()
+
+
+class AudioHost:
+    """
+    One shared PortAudio instance with a cached input device inventory.
+
+    PortAudio initialisation and device enumeration are slow, so the host is
+    created once, on first use, and the inventory is reused until it is older
+    than ttl or refresh() is called. Recording opens its streams through the
+    host instead of creating and terminating its own PyAudio object.
+
+    backend_factory returns an object with the PyAudio interface, which lets
+    a fake backend stand in where no sound card is available.
+    """
+
+    def __init__(self, backend_factory=_default_backend, ttl=INVENTORY_TTL):
+        self.ttl = ttl
+        self._backend_factory = backend_factory
+        self._backend = None
+        self._devices = None
+        self._scanned_at = 0.0
+        self._open_streams = 0
+        self._lock = threading.RLock()
+        self.scans = 0
+
+    @property
+    def backend(self):
+        """The PortAudio (PyAudio) object, created on first use."""
+        with self._lock:
+            if self._backend is None:
+                self._backend = self._backend_factory()
+            return self._backend
+
+    def _scan(self):
+        backend = self.backend
+        try:
+            default_index = backend.get_default_input_device_info()["index"]
+        except (IOError, OSError, KeyError):
+            default_index = None
+
+        devices = []
+        for i in range(backend.get_device_count()):
+            info = backend.get_device_info_by_index(i)
+            if info["maxInputChannels"] > 0:
+                devices.append(AudioDevice(i, info["name"], info["maxInputChannels"],
+                                           int(info["defaultSampleRate"]), i == default_index))
+        self._devices = devices
+        self._scanned_at = time.monotonic()
+        self.scans += 1
+        return devices
+
+    def input_devices(self, max_age=None):
+        """
+        Return the cached list of input devices, rescanning if it is older
+        than max_age seconds (ttl by default).
+
+        Returns:
+            list[AudioDevice]: Devices with at least one input channel.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if self._devices is None or time.monotonic() - self._scanned_at >= max_age:
+                return list(self._scan())
+            return list(self._devices)
+
+    def refresh(self):
+        """
+        Rescan devices now. PortAudio only sees devices plugged in after it
+        started once it is restarted, so the backend is restarted too unless
+        a stream is still open on it.
+
+        Returns:
+            list[AudioDevice]: The new inventory.
+        """
+        with self._lock:
+            if self._backend is not None and self._open_streams == 0:
+                self._backend.terminate()
+                self._backend = None
+            return list(self._scan())
+
+    def default_input_device(self):
+        """Return the system default input device, or the first one, or None."""
+        devices = self.input_devices()
+        for device in devices:
+            if device.is_default:
+                return device
+        return devices[0] if devices else None
+
+    def resolve_input(self, device_index=None, sample_rate=16000, channels=1):
+        """
+        Pick the device and capture rate to record with.
+
+        The requested rate is used if the device supports it, otherwise the
+        device's default rate, and the caller resamples.
+
+        Args:
+            device_index (int): Device to use, or None for the default.
+            sample_rate (int): Preferred capture rate.
+            channels (int): Channels to capture.
+
+        Returns:
+            tuple: (AudioDevice, capture_rate).
+
+        Raises:
+            ValueError: If there is no such input device.
+        """
+        if device_index is None:
+            device = self.default_input_device()
+        else:
+            device = next((d for d in self.input_devices() if d.index == device_index), None)
+        if device is None:
+            raise ValueError("No microphone detected. Please connect a microphone and try again."
+                             if device_index is None else f"No input device {device_index}")
+
+        with self._lock:
+            try:
+                self.backend.is_format_supported(sample_rate, input_device=device.index,
+                                                 input_channels=channels,
+                                                 input_format=PA_INT16)
+                return device, sample_rate
+            except ValueError:
+                # PyAudio raises ValueError for unsupported formats
+                return device, device.default_sample_rate
+
+    def open_input(self, device_index, sample_rate, channels=1, frames_per_buffer=1024):
+        """Open an int16 input stream on the shared backend."""
+        with self._lock:
+            stream = self.backend.open(format=PA_INT16, channels=channels, rate=sample_rate,
+                                       input=True, input_device_index=device_index,
+                                       frames_per_buffer=frames_per_buffer)
+            self._open_streams += 1
+        return stream
+
+    def close_stream(self, stream):
+        """Stop and close a stream opened with open_input()."""
+        try:
+            stream.stop_stream()
+            stream.close()
+        finally:
+            with self._lock:
+                self._open_streams -= 1
+
+    def sample_size(self, sample_format=PA_INT16):
+        """Bytes per sample for a PortAudio sample format."""
+        return self.backend.get_sample_size(sample_format)
+
+    def terminate(self):
+        """Release PortAudio. A later call starts it again."""
+        with self._lock:
+            if self._backend is not None:
+                self._backend.terminate()
+                self._backend = None
+            self._devices = None
+
+
+_host = None
+_host_lock = threading.Lock()
+
+
+def get_audio_host():
+    """Return the process-wide audio host."""
+    global _host
+    with _host_lock:
+        if _host is None:
+            _host = AudioHost()
+        return _host
+
+
+def set_audio_host(host):
+    """
+    Replace the process-wide audio host, e.g. with one built on a fake
+    backend. Returns the previous host.
+    """
+    global _host
+    with _host_lock:
+        previous, _host = _host, host
+        return previous
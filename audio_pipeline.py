@@ -0,0 +1,363 @@
+import mmap
+import shutil
+import struct
+import subprocess
+import wave
+import warnings
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # removed from the standard library in Python 3.13
+    audioop = None
+
+# Format expected by the Vosk recognizer
+TARGET_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2
+
+# Frames handed to AcceptWaveform per call
+CHUNK_FRAMES = 4000
+
+
+def is_recognizer_format(channels, sample_width, frame_rate):
+    """Check whether PCM parameters can be fed to the recognizer as-is."""
+    return (channels == TARGET_CHANNELS
+            and sample_width == TARGET_SAMPLE_WIDTH
+            and frame_rate == TARGET_RATE)
+
+
+class _PrefixedStream:
+    """Replays bytes already read from a non-seekable stream before the rest of it."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            data, self._prefix = self._prefix + self._stream.read(), b""
+            return data
+        data, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+
+def _iter_wav_native(wav_file, chunk_frames):
+    """Read 16 kHz mono int16 WAV frames straight from the file."""
+    while True:
+        data = wav_file.readframes(chunk_frames)
+        if len(data) == 0:
+            break
+        yield data
+
+
+def _pcm_converter_class():
+    """Return resampler.PCMConverter, or None if NumPy is not installed."""
+    try:
+        from resampler import PCMConverter
+    except ImportError:
+        return None
+    return PCMConverter
+
+
+def _can_convert(channels, sample_width):
+    if sample_width not in (1, 2, 3, 4) or channels < 1:
+        return False
+    return _pcm_converter_class() is not None or (audioop is not None and channels in (1, 2))
+
+
+def _source_frames(chunk_frames, frame_rate):
+    """Source frames to read to produce roughly chunk_frames output frames."""
+    return max(1, chunk_frames * frame_rate // TARGET_RATE)
+
+
+def _convert_blocks(blocks, channels, sample_width, frame_rate):
+    """
+    Downmix and resample PCM blocks of any rate/width/channel count to
+    recognizer format with the NumPy polyphase resampler, keeping its state
+    between blocks. Uses audioop when NumPy is not available.
+    """
+    converter_class = _pcm_converter_class()
+    if converter_class is None:
+        yield from _convert_blocks_audioop(blocks, channels, sample_width, frame_rate)
+        return
+
+    converter = converter_class(channels, sample_width, frame_rate, TARGET_RATE)
+    for data in blocks:
+        data = converter.convert(data)
+        if data:
+            yield data
+    data = converter.flush()
+    if data:
+        yield data
+
+
+def _convert_blocks_audioop(blocks, channels, sample_width, frame_rate):
+    """_convert_blocks() for mono or stereo input using audioop."""
+    state = None
+    for data in blocks:
+        if sample_width == 1:
+            # 8-bit WAV is unsigned; audioop works on signed samples
+            data = audioop.bias(data, 1, -128)
+        if sample_width != TARGET_SAMPLE_WIDTH:
+            data = audioop.lin2lin(data, sample_width, TARGET_SAMPLE_WIDTH)
+        if channels == 2:
+            data = audioop.tomono(data, TARGET_SAMPLE_WIDTH, 0.5, 0.5)
+        if frame_rate != TARGET_RATE:
+            data, state = audioop.ratecv(data, TARGET_SAMPLE_WIDTH, TARGET_CHANNELS,
+                                         frame_rate, TARGET_RATE, state)
+        if data:
+            yield data
+
+
+def _iter_wav_converted(wav_file, chunk_frames):
+    """Stream a PCM WAV that is not in recognizer format through _convert_blocks()."""
+    source_frames = _source_frames(chunk_frames, wav_file.getframerate())
+    blocks = iter(lambda: wav_file.readframes(source_frames), b"")
+    return _convert_blocks(blocks, wav_file.getnchannels(), wav_file.getsampwidth(),
+                           wav_file.getframerate())
+
+
+def _iter_wav(wav_file, chunk_frames):
+    """Pick the cheapest path for an open WAV, or return None if unsupported."""
+    channels = wav_file.getnchannels()
+    sample_width = wav_file.getsampwidth()
+    if is_recognizer_format(channels, sample_width, wav_file.getframerate()):
+        return _iter_wav_native(wav_file, chunk_frames)
+    if _can_convert(channels, sample_width):
+        return _iter_wav_converted(wav_file, chunk_frames)
+    return None
+
+
+def _parse_wav_header(buf):
+    """
+    Find the format and PCM data of a WAV file held in buf.
+
+    Returns:
+        tuple: (channels, sample_width, frame_rate, data_offset, data_length),
+        or None if buf is not an uncompressed PCM WAV.
+    """
+    if len(buf) < 12 or buf[0:4] != b"RIFF" or buf[8:12] != b"WAVE":
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(buf):
+        chunk_id = buf[offset:offset + 4]
+        size, = struct.unpack_from("<I", buf, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if size < 16 or body + size > len(buf):
+                return None
+            tag, channels, frame_rate, _, block_align, bits = struct.unpack_from(
+                "<HHIIHH", buf, body)
+            if tag == 0xFFFE and size >= 40:
+                # WAVE_FORMAT_EXTENSIBLE: the real format is in the sub-format GUID
+                tag, = struct.unpack_from("<H", buf, body + 24)
+            sample_width = (bits + 7) // 8
+            if tag != 1 or channels == 0 or block_align != channels * sample_width:
+                return None
+            fmt = (channels, sample_width, frame_rate, block_align)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            channels, sample_width, frame_rate, block_align = fmt
+            # Files from interrupted or streaming writers may claim more data
+            # than they hold
+            length = min(size, len(buf) - body)
+            return channels, sample_width, frame_rate, body, length - length % block_align
+        offset = body + size + (size & 1)
+    return None
+
+
+def _map_wav(audio_file_path):
+    """
+    Memory-map a PCM WAV the pipeline can handle.
+
+    Returns:
+        tuple: (mmap, header) with header as from _parse_wav_header(), or
+        None if the file is not such a WAV.
+    """
+    with open(audio_file_path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return None
+    header = _parse_wav_header(mapped)
+    if header is None or not (is_recognizer_format(*header[:3]) or _can_convert(*header[:2])):
+        mapped.close()
+        return None
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped, header
+
+
+def _iter_mapped_wav(mapped, header, chunk_frames):
+    """
+    Yield memoryview slices of a mapped WAV's PCM data, converted to
+    recognizer format block by block if needed.
+    """
+    channels, sample_width, frame_rate, offset, length = header
+    pcm = memoryview(mapped)[offset:offset + length]
+    try:
+        if is_recognizer_format(channels, sample_width, frame_rate):
+            chunk_bytes = chunk_frames * TARGET_SAMPLE_WIDTH * TARGET_CHANNELS
+            for start in range(0, length, chunk_bytes):
+                yield pcm[start:start + chunk_bytes]
+        else:
+            chunk_bytes = _source_frames(chunk_frames, frame_rate) * channels * sample_width
+            blocks = (pcm[start:start + chunk_bytes] for start in range(0, length, chunk_bytes))
+            yield from _convert_blocks(blocks, channels, sample_width, frame_rate)
+    finally:
+        pcm.release()
+        try:
+            mapped.close()
+        except BufferError:
+            # The consumer still holds blocks; the mapping goes away with them
+            pass
+
+
+def _iter_ffmpeg(audio_file_path, chunk_frames):
+    """
+    Decode compressed input with an ffmpeg subprocess that writes 16 kHz mono
+    int16 PCM to a pipe, so blocks are available as soon as ffmpeg produces
+    them and the whole file is never held in memory.
+    """
+    from pydub import AudioSegment
+
+    process = subprocess.Popen(
+        [AudioSegment.converter, "-nostdin", "-v", "error", "-i", audio_file_path,
+         "-f", "s16le", "-acodec", "pcm_s16le",
+         "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_RATE), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    chunk_bytes = chunk_frames * TARGET_SAMPLE_WIDTH * TARGET_CHANNELS
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode '{audio_file_path}': "
+                               f"{process.stderr.read().decode(errors='replace').strip()}")
+    finally:
+        # Also reached when the consumer stops early
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def _iter_decoded(audio_file_path, chunk_frames):
+    """
+    Decode compressed input (MP3 etc.) with pydub in memory and hand out
+    bounded slices of the resampled PCM without touching the disk.
+    """
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(audio_file_path)
+    audio = (audio.set_frame_rate(TARGET_RATE)
+                  .set_channels(TARGET_CHANNELS)
+                  .set_sample_width(TARGET_SAMPLE_WIDTH))
+
+    pcm = memoryview(audio.raw_data)
+    chunk_bytes = chunk_frames * TARGET_SAMPLE_WIDTH * TARGET_CHANNELS
+    for offset in range(0, len(pcm), chunk_bytes):
+        yield bytes(pcm[offset:offset + chunk_bytes])
+
+
+def iter_pcm_chunks(audio_file_path, chunk_frames=CHUNK_FRAMES):
+    """
+    Yield the audio in audio_file_path as 16 kHz mono int16 PCM blocks.
+
+    PCM WAV files are memory-mapped. Those already in recognizer format
+    (such as the recordings made by AudioRecorder) are handed out as
+    memoryview slices of the mapping, with no copying or resampling; others
+    are downmixed and resampled block by block with resampler.PCMConverter.
+    Recordings stored by archive.py are decoded block by block. WAVs the
+    mapping cannot handle are read with the wave module. Anything else is
+    streamed out of ffmpeg, or decoded with pydub if ffmpeg cannot be
+    found. Nothing is written to disk, so concurrent calls never share
+    state.
+
+    Args:
+        audio_file_path (str): Path to the audio file.
+        chunk_frames (int): Maximum number of output frames per block.
+
+    Yields:
+        bytes-like: Raw PCM blocks for AcceptWaveform (bytes or memoryview).
+    """
+    mapped = _map_wav(audio_file_path)
+    if mapped is not None:
+        yield from _iter_mapped_wav(*mapped, chunk_frames)
+        return
+
+    from archive import is_archive, iter_archive_chunks
+
+    if is_archive(audio_file_path):
+        yield from iter_archive_chunks(audio_file_path, chunk_frames)
+        return
+
+    try:
+        wav_file = wave.open(audio_file_path, "rb")
+    except (wave.Error, EOFError):
+        wav_file = None
+
+    if wav_file is not None:
+        with wav_file:
+            blocks = _iter_wav(wav_file, chunk_frames)
+            if blocks is not None:
+                yield from blocks
+                return
+
+    # pydub is only needed for formats the wave module cannot read
+    from pydub import AudioSegment
+
+    if shutil.which(AudioSegment.converter):
+        yield from _iter_ffmpeg(audio_file_path, chunk_frames)
+    else:
+        yield from _iter_decoded(audio_file_path, chunk_frames)
+
+
+def iter_pcm_chunks_from_stream(stream, chunk_frames=CHUNK_FRAMES):
+    """
+    Yield 16 kHz mono int16 PCM blocks from a binary file-like object.
+
+    Streams that start with a RIFF header are parsed as WAV and converted like
+    files. Anything else is taken to be raw 16 kHz mono int16 PCM already.
+    The stream does not need to be seekable.
+
+    Args:
+        stream: Object with a read(size) method returning bytes.
+        chunk_frames (int): Maximum number of output frames per block.
+
+    Yields:
+        bytes: Raw PCM blocks for AcceptWaveform.
+    """
+    header = stream.read(4)
+    source = _PrefixedStream(header, stream)
+
+    if header == b"RIFF":
+        with wave.open(source, "rb") as wav_file:
+            blocks = _iter_wav(wav_file, chunk_frames)
+            if blocks is None:
+                raise ValueError("Unsupported WAV format in stream")
+            yield from blocks
+        return
+
+    chunk_bytes = chunk_frames * TARGET_SAMPLE_WIDTH * TARGET_CHANNELS
+    while True:
+        data = source.read(chunk_bytes)
+        if not data:
+            break
+        if len(data) % TARGET_SAMPLE_WIDTH:
+            # Short read from a pipe; complete the last sample
+            data += source.read(TARGET_SAMPLE_WIDTH - len(data) % TARGET_SAMPLE_WIDTH)
+        yield data
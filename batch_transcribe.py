@@ -0,0 +1,272 @@
+"""
+Offline batch transcription.
+
+Walks directories (or reads a manifest of paths), transcribes every matching
+file across a pool of worker processes that each keep one warm model, and
+stores the transcripts in the database in batched transactions.
+
+Progress is recorded in the batch_files table in the same transaction as the
+transcripts, so an interrupted run picks up where it stopped when started
+again. A file is transcribed again only if its size or modification time
+changed, or with --retry-failed if it failed before.
+
+Usage:
+    python batch_transcribe.py --user-id 1 recordings/
+    python batch_transcribe.py --user-id 1 --manifest files.txt --workers 8
+    python batch_transcribe.py --user-id 1 --pattern "*.mp3" --recursive archive/
+"""
+import argparse
+import fnmatch
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from audio_pipeline import iter_pcm_chunks, TARGET_RATE, TARGET_SAMPLE_WIDTH
+from database import DB_PATH, get_pool, get_batch_progress, save_batch_results
+from model_registry import get_model, preload_models
+from speech_recognition import stream_transcription, MODEL_PATH
+from transcript import Transcript
+
+DEFAULT_PATTERNS = ["recording_*.wav", "uploaded_*"]
+
+
+def find_files(inputs, patterns=DEFAULT_PATTERNS, recursive=False):
+    """
+    Expand files and directories into a sorted list of audio file paths.
+
+    Args:
+        inputs (list[str]): Files are taken as given; directories are
+            searched for names matching any of patterns.
+        patterns (list[str]): Shell-style name patterns.
+        recursive (bool): Also search subdirectories.
+
+    Returns:
+        list[str]: Absolute paths without duplicates.
+    """
+    found = set()
+    for item in inputs:
+        if os.path.isfile(item):
+            found.add(os.path.abspath(item))
+            continue
+        for root, dirs, files in os.walk(item):
+            found.update(os.path.abspath(os.path.join(root, name)) for name in files
+                         if any(fnmatch.fnmatch(name, pattern) for pattern in patterns))
+            if not recursive:
+                break
+    return sorted(found)
+
+
+def read_manifest(manifest_path):
+    """Read one path per line, ignoring blank lines and # comments."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    paths = []
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(os.path.join(base, line))
+    return paths
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def _transcribe_file(key, model_path):
+    """
+    Run inside a worker process with that worker's warm model.
+
+    Returns:
+        dict: The fields save_batch_results() expects, plus elapsed seconds.
+
+    Raises:
+        Exception: If the model cannot be loaded. That is not the file's
+            fault, so it stops the run instead of being recorded as a
+            failure of this file.
+    """
+    path, size, mtime_ns = key
+    get_model(model_path)
+    result = {"path": path, "size": size, "mtime_ns": mtime_ns}
+    audio_bytes = 0
+
+    def counted_chunks():
+        nonlocal audio_bytes
+        for data in iter_pcm_chunks(path):
+            audio_bytes += len(data)
+            yield data
+
+    started = time.perf_counter()
+    try:
+        transcript = Transcript()
+        for event in stream_transcription(counted_chunks(), model_path, partial_results=False):
+            transcript.add_result({"text": event.text, "result": event.words})
+        result["transcript"] = transcript
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    result["elapsed"] = time.perf_counter() - started
+    result["audio_seconds"] = audio_bytes / TARGET_SAMPLE_WIDTH / TARGET_RATE
+    return result
+
+
+def run_batch(paths, user_id, model_path=MODEL_PATH, workers=None, batch_size=50,
+              flush_seconds=10.0, retry_failed=False, log=print):
+    """
+    Transcribe paths and store the results, skipping files already done.
+
+    Args:
+        paths (list[str]): Audio files to process.
+        user_id (int): Owner of the created sessions.
+        model_path (str): Path to the Vosk model directory.
+        workers (int): Worker processes, one warm model each. Defaults to
+            the number of CPUs.
+        batch_size (int): Results written per database transaction.
+        flush_seconds (float): Also write a partial batch this often, so
+            little work is lost if the run is interrupted.
+        retry_failed (bool): Redo files that failed in an earlier run.
+        log (callable): Receives one progress line per file.
+
+    Returns:
+        dict: Counts and timing for the run.
+    """
+    workers = workers or os.cpu_count() or 1
+    progress = get_batch_progress()
+    pending_keys = []
+    skipped = 0
+    for path in paths:
+        try:
+            key = _file_key(path)
+        except OSError as e:
+            log(f"skip {path}: {e}")
+            skipped += 1
+            continue
+        status = progress.get(key)
+        if status == "done" or (status == "failed" and not retry_failed):
+            skipped += 1
+        else:
+            pending_keys.append(key)
+
+    stats = {"files": len(pending_keys), "skipped": skipped, "done": 0, "failed": 0,
+             "sessions": 0, "audio_seconds": 0.0, "worker_seconds": 0.0}
+    batch = []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal batch, last_flush
+        if batch:
+            stats["sessions"] += save_batch_results(user_id, batch)
+            batch = []
+        last_flush = time.monotonic()
+
+    started = time.perf_counter()
+    keys = iter(pending_keys)
+    # Spawned for the same reason as TranscriptionService's pool: a forked
+    # worker can inherit a model load lock held by another thread
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=preload_models, initargs=(model_path,)) as pool:
+        # Keep only a couple of jobs per worker in flight so results stream
+        # back steadily and a huge file list is not all queued at once
+        in_flight = set()
+        try:
+            while True:
+                for key in keys:
+                    in_flight.add(pool.submit(_transcribe_file, key, model_path))
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, timeout=flush_seconds,
+                                           return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    stats["audio_seconds"] += result["audio_seconds"]
+                    stats["worker_seconds"] += result["elapsed"]
+                    if result.get("error"):
+                        stats["failed"] += 1
+                        log(f"FAILED {result['path']}: {result['error']}")
+                    else:
+                        stats["done"] += 1
+                        log(f"done   {result['path']} ({result['audio_seconds']:.1f}s audio "
+                            f"in {result['elapsed']:.1f}s)")
+                    batch.append(result)
+
+                if len(batch) >= batch_size or time.monotonic() - last_flush >= flush_seconds:
+                    flush()
+        finally:
+            # Keep everything that finished, even when interrupted
+            for future in in_flight:
+                future.cancel()
+            flush()
+
+    stats["wall_seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="Audio files or directories")
+    parser.add_argument("--manifest", help="File listing one audio path per line")
+    parser.add_argument("--pattern", action="append",
+                        help="File name pattern in directories (repeatable, default: "
+                             + ", ".join(DEFAULT_PATTERNS) + ")")
+    parser.add_argument("--recursive", action="store_true", help="Search subdirectories")
+    parser.add_argument("--user-id", type=int, required=True,
+                        help="User the transcripts are saved for")
+    parser.add_argument("--model", default=os.environ.get("VOSK_MODEL_PATH", MODEL_PATH),
+                        help="Vosk model directory (default: $VOSK_MODEL_PATH)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Results written per database transaction")
+    parser.add_argument("--db", default=DB_PATH, help="Database file")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Transcribe files that failed in an earlier run again")
+    args = parser.parse_args(argv)
+
+    paths = find_files(args.inputs, args.pattern or DEFAULT_PATTERNS, args.recursive)
+    if args.manifest:
+        paths = sorted(set(paths) | set(find_files(read_manifest(args.manifest),
+                                                   args.pattern or DEFAULT_PATTERNS,
+                                                   args.recursive)))
+    if not paths:
+        parser.error("no audio files found")
+
+    # A missing or broken model would otherwise fail every file
+    try:
+        get_model(args.model)
+    except Exception as e:
+        parser.error(f"cannot load model '{args.model}': {e}")
+
+    # Open the requested database before anything else uses the default one
+    get_pool(args.db)
+
+    try:
+        stats = run_batch(paths, args.user_id, model_path=args.model, workers=args.workers,
+                          batch_size=args.batch_size, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        print("Interrupted; finished files were saved and will be skipped next run.")
+        return
+    except Exception as e:
+        sys.exit(f"Stopped: {e}. Files saved before this will be skipped next run.")
+
+    processed = stats["done"] + stats["failed"]
+    wall = stats["wall_seconds"]
+    audio = stats["audio_seconds"]
+    print()
+    print(f"files: {processed} processed ({stats['done']} done, {stats['failed']} failed), "
+          f"{stats['skipped']} skipped, {stats['sessions']} sessions saved")
+    print(f"wall time: {wall:.1f}s   files/s: {processed / wall if wall else 0:.2f}   "
+          f"audio: {audio:.1f}s")
+    if audio:
+        # Wall RTF is what the whole pool achieved; per-worker RTF is the
+        # cost of recognizing one second of audio on one core
+        print(f"RTF (wall): {wall / audio:.4f}   RTF (per worker): "
+              f"{stats['worker_seconds'] / audio:.4f}")
+
+
+if __name__ == "__main__":
+    main()
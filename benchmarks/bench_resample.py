@@ -0,0 +1,183 @@
+"""
+Benchmark and accuracy check for converting PCM WAV input to recognizer
+format (16 kHz mono int16).
+
+The bundled recordings are already 16 kHz mono, so each one is first
+rendered as 44.1 kHz and 48 kHz stereo WAVs in a temporary directory. Each
+of those is then converted back with:
+
+    numpy      iter_pcm_chunks(): block-wise polyphase resampler (resampler.py)
+    audioop    the previous block-wise audioop.ratecv path, if available
+    pydub      AudioSegment.set_frame_rate(16000).set_channels(1), whole file
+
+and reports the median time, the speed as a multiple of real time, and the
+signal-to-error ratio against an FFT (ideal band-limited) resampling of the
+same input. The NumPy resampler is also checked for giving identical output
+whatever the block size.
+
+Usage:
+    python benchmarks/bench_resample.py
+    python benchmarks/bench_resample.py --runs 10 --files a.wav b.wav
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import audio_pipeline  # noqa: E402
+from audio_pipeline import iter_pcm_chunks, TARGET_RATE  # noqa: E402
+from resampler import PolyphaseResampler, pcm_to_mono, to_pcm16  # noqa: E402
+
+SOURCE_RATES = [44100, 48000]
+
+
+def read_mono16(path):
+    with wave.open(path, "rb") as wav_file:
+        return pcm_to_mono(wav_file.readframes(wav_file.getnframes()),
+                           wav_file.getnchannels(), wav_file.getsampwidth())
+
+
+def render_stereo(samples, from_rate, to_rate, path):
+    """
+    Write samples as a stereo WAV at to_rate, with slightly different
+    channels. A quiet 12 kHz tone is added, as real 44.1/48 kHz audio has
+    content above 8 kHz that resampling to 16 kHz must remove rather than
+    fold back into the speech band.
+    """
+    resampler = PolyphaseResampler(from_rate, to_rate)
+    upsampled = np.concatenate([resampler.process(samples), resampler.flush()])
+    upsampled += 0.03 * np.abs(samples).max() * np.sin(
+        2 * np.pi * 12000 / to_rate * np.arange(len(upsampled)))
+    stereo = np.stack([upsampled, 0.8 * upsampled], axis=1)
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(to_rate)
+        wav_file.writeframes(to_pcm16(stereo))
+
+
+def reference(path):
+    """Downmix, then resample by truncating the spectrum: the ideal low-pass."""
+    with wave.open(path, "rb") as wav_file:
+        rate = wav_file.getframerate()
+        mono = pcm_to_mono(wav_file.readframes(wav_file.getnframes()),
+                           wav_file.getnchannels(), wav_file.getsampwidth())
+    output_length = -(-len(mono) * TARGET_RATE // rate)
+    # Pad so the length converts exactly and both frequency grids line up
+    step = rate // np.gcd(rate, TARGET_RATE)
+    padded = np.zeros(-(-len(mono) // step) * step)
+    padded[:len(mono)] = mono
+    padded_length = len(padded) * TARGET_RATE // rate
+    spectrum = np.fft.rfft(padded)[:padded_length // 2 + 1]
+    return (np.fft.irfft(spectrum, padded_length) * padded_length / len(padded))[:output_length]
+
+
+def convert_numpy(path):
+    return b"".join(iter_pcm_chunks(path))
+
+
+def convert_audioop(path):
+    with wave.open(path, "rb") as wav_file:
+        blocks = iter(lambda: wav_file.readframes(11025), b"")
+        return b"".join(audio_pipeline._convert_blocks_audioop(
+            blocks, wav_file.getnchannels(), wav_file.getsampwidth(),
+            wav_file.getframerate()))
+
+
+def convert_pydub(path):
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_wav(path)
+    return audio.set_frame_rate(TARGET_RATE).set_channels(1).set_sample_width(2).raw_data
+
+
+def signal_to_error_db(output, expected):
+    """Signal-to-error ratio in dB, ignoring 50 ms at each end."""
+    output = np.frombuffer(output, "<i2").astype(np.float64)
+    length = min(len(output), len(expected))
+    edge = TARGET_RATE // 20
+    output, expected = output[edge:length - edge], expected[edge:length - edge]
+    error = np.mean((output - expected) ** 2)
+    return float("inf") if error == 0 else 10 * np.log10(np.mean(expected ** 2) / error)
+
+
+def check_block_invariance(samples, rate):
+    """Whether resampling samples from rate gives the same output for any block size."""
+    outputs = []
+    for block in (1, 997, 4000, len(samples)):
+        resampler = PolyphaseResampler(rate, TARGET_RATE)
+        parts = [resampler.process(samples[i:i + block]) for i in range(0, len(samples), block)]
+        outputs.append(np.concatenate(parts + [resampler.flush()]))
+    return all(np.array_equal(outputs[0], other) for other in outputs[1:])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*",
+                        help="16 kHz WAV files (default: the bundled *.wav recordings)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(REPO_ROOT, "*.wav")))
+    if not files:
+        parser.error("no audio files found")
+
+    converters = [("numpy", convert_numpy), ("pydub", convert_pydub)]
+    if audio_pipeline.audioop is not None:
+        converters.insert(1, ("audioop", convert_audioop))
+
+    results = []
+    print(f"runs: {args.runs}   files: {len(files)}")
+    print(f"{'file':<32} {'rate':>6} {'method':<8} {'median (ms)':>12} {'x realtime':>11} "
+          f"{'SER (dB)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in files:
+            with wave.open(path, "rb") as wav_file:
+                source_rate = wav_file.getframerate()
+            samples = read_mono16(path)
+            for rate in SOURCE_RATES:
+                rendered = os.path.join(tmp, f"{rate}_{os.path.basename(path)}")
+                render_stereo(samples, source_rate, rate, rendered)
+                expected = reference(rendered)
+                seconds = len(expected) / TARGET_RATE
+                for method, convert in converters:
+                    timings = []
+                    for _ in range(args.runs):
+                        started = time.perf_counter()
+                        output = convert(rendered)
+                        timings.append(time.perf_counter() - started)
+                    median = statistics.median(timings)
+                    ser = signal_to_error_db(output, expected)
+                    print(f"{os.path.basename(path):<32} {rate:>6} {method:<8} "
+                          f"{median * 1000:>12.1f} {seconds / median:>11.0f} {ser:>9.1f}")
+                    results.append({"file": path, "rate": rate, "method": method,
+                                    "median_ms": median * 1000, "realtime": seconds / median,
+                                    "ser_db": ser})
+
+        invariant = all(check_block_invariance(read_mono16(path)[:TARGET_RATE * 2], rate)
+                        for path in files[:1] for rate in SOURCE_RATES)
+    print()
+    print(f"numpy output independent of block size: {'yes' if invariant else 'NO'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "results": results,
+                       "block_size_invariant": invariant}, f, indent=2)
+    if not invariant:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark for app cold start.
+
+Imports the app's modules in the order a Streamlit worker meets them, in a
+fresh interpreter per run, and reports the median time of each phase:
+
+    streamlit      the UI framework itself
+    login page     what app.py imports before anyone logs in
+    dashboard      speech_recognition, model registry and worker pool modules
+    vosk, pydub,   audio and ASR dependencies, loaded on first real use
+    numpy, pyaudio
+    mic check      first check_microphone() call, then a cached rerun
+
+Phases that fail (e.g. pyaudio is not installed) are reported as errors and
+do not stop the run. --importtime lists the slowest individual modules using
+python -X importtime.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = [
+    ("streamlit", "import streamlit"),
+    ("login page", "import transcript, database"),
+    ("dashboard", "import speech_recognition, model_registry, transcription_service"),
+    ("vosk", "import vosk"),
+    ("pydub", "import pydub"),
+    ("numpy + vad", "import numpy, vad"),
+    ("pyaudio", "import pyaudio"),
+    ("mic check", "speech_recognition.check_microphone()"),
+    ("mic check (cached)", "speech_recognition.check_microphone()"),
+]
+
+_CHILD = """
+import json, sys, time
+timings = {}
+for name, statement in json.loads(sys.argv[1]):
+    started = time.perf_counter()
+    try:
+        exec(statement, globals())
+        timings[name] = time.perf_counter() - started
+    except Exception as e:
+        timings[name] = "error: " + (str(e) or type(e).__name__)
+print(json.dumps(timings))
+"""
+
+
+def run_once():
+    """Time every phase in a fresh interpreter."""
+    output = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(PHASES)],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(statement, count):
+    """
+    Return the count slowest modules by self time from python -X importtime.
+
+    Returns:
+        list[tuple]: (self_us, cumulative_us, module) sorted by self time.
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    rows = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", type=int, metavar="N", default=0,
+                        help="Also list the N slowest modules imported by the app")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+
+    results = []
+    print(f"runs: {args.runs}   python: {sys.version.split()[0]}")
+    print(f"{'phase':<20} {'median (ms)':>12} {'min (ms)':>10}")
+    for name, _ in PHASES:
+        values = [run[name] for run in runs if isinstance(run[name], float)]
+        if not values:
+            print(f"{name:<20} {runs[0][name]}")
+            results.append({"phase": name, "error": runs[0][name]})
+            continue
+        median, fastest = statistics.median(values) * 1000, min(values) * 1000
+        print(f"{name:<20} {median:>12.1f} {fastest:>10.1f}")
+        results.append({"phase": name, "median_ms": median, "min_ms": fastest})
+
+    if args.importtime:
+        print()
+        print(f"{'self (ms)':>10} {'cumul. (ms)':>12}  module")
+        statement = "; ".join(statement for _, statement in PHASES[:-2])
+        for self_us, cumulative_us, module in slowest_imports(statement, args.importtime):
+            print(f"{self_us / 1000:>10.1f} {cumulative_us / 1000:>12.1f}  {module}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "phases": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
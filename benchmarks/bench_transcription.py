@@ -0,0 +1,273 @@
+"""
+Benchmark for the transcription hot path.
+
+Measures model load, decode/resample and recognition separately on the
+bundled recordings, reporting p50/p95 latency, real-time factor and peak RSS
+per stage, plus throughput at 1..N concurrent jobs.
+
+Runs fully offline. When vosk or the model directory is unavailable (or with
+--stub) a stub recognizer stands in, so decode numbers and regressions in the
+pipeline can still be tracked.
+
+Usage:
+    python benchmarks/bench_transcription.py
+    python benchmarks/bench_transcription.py --model /path/to/model --repeat 10 --max-concurrency 8
+    python benchmarks/bench_transcription.py --stub --json results.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from audio_pipeline import iter_pcm_chunks, TARGET_RATE, TARGET_SAMPLE_WIDTH  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "")
+
+
+class StubModel:
+    """Stands in for vosk.Model when no model is available."""
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+
+class StubRecognizer:
+    """
+    Stands in for KaldiRecognizer. Does a fixed amount of work per byte so
+    recognition-stage numbers stay comparable between runs.
+    """
+
+    def __init__(self, model, sample_rate):
+        self._samples = 0
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        samples = memoryview(data).cast("B").cast("h")
+        self._samples += len(samples)
+        # Cheap deterministic CPU load: peak of the block
+        max(samples, default=0)
+        return False
+
+    def Result(self):
+        return '{"text": ""}'
+
+    def FinalResult(self):
+        return json.dumps({"text": "", "samples": self._samples})
+
+
+def _load_backend(model_path, use_stub):
+    """Return (Model class, Recognizer class, backend name)."""
+    if not use_stub and model_path and os.path.isdir(model_path):
+        try:
+            from vosk import Model, KaldiRecognizer, SetLogLevel
+            SetLogLevel(-1)
+            return Model, KaldiRecognizer, "vosk"
+        except ImportError:
+            print("vosk is not installed; using the stub recognizer")
+    return StubModel, StubRecognizer, "stub"
+
+
+def _rss_bytes():
+    """Current RSS in bytes (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _audio_seconds(chunks):
+    return sum(len(c) for c in chunks) / TARGET_SAMPLE_WIDTH / TARGET_RATE
+
+
+def _recognize(model, recognizer_cls, chunks):
+    recognizer = recognizer_cls(model, TARGET_RATE)
+    recognizer.SetWords(True)
+    for data in chunks:
+        if recognizer.AcceptWaveform(data):
+            recognizer.Result()
+    recognizer.FinalResult()
+
+
+def _stage_worker(stage, files, model_path, use_stub, repeat):
+    """
+    Run one stage in a fresh process so its peak RSS is not polluted by the
+    other stages. Returns latencies, audio durations and RSS figures.
+    """
+    model_cls, recognizer_cls, backend = _load_backend(model_path, use_stub)
+    baseline_rss = _rss_bytes()
+    latencies = []
+    audio_seconds = []
+
+    if stage == "model_load":
+        for _ in range(repeat):
+            started = time.perf_counter()
+            model = model_cls(model_path)
+            latencies.append(time.perf_counter() - started)
+            del model
+
+    elif stage == "decode":
+        for _ in range(repeat):
+            for path in files:
+                started = time.perf_counter()
+                # Memory-mapped blocks are lazy; copying them reads every page
+                chunks = [bytes(c) for c in iter_pcm_chunks(path)]
+                latencies.append(time.perf_counter() - started)
+                audio_seconds.append(_audio_seconds(chunks))
+
+    elif stage == "recognition":
+        model = model_cls(model_path)
+        decoded = [[bytes(c) for c in iter_pcm_chunks(path)] for path in files]
+        baseline_rss = _rss_bytes()
+        for _ in range(repeat):
+            for chunks in decoded:
+                started = time.perf_counter()
+                _recognize(model, recognizer_cls, chunks)
+                latencies.append(time.perf_counter() - started)
+                audio_seconds.append(_audio_seconds(chunks))
+
+    return {
+        "backend": backend,
+        "latencies": latencies,
+        "audio_seconds": audio_seconds,
+        "baseline_rss": baseline_rss,
+        "peak_rss": _peak_rss_bytes(),
+    }
+
+
+_worker_model = None
+_worker_recognizer_cls = None
+
+
+def _throughput_init(model_path, use_stub):
+    global _worker_model, _worker_recognizer_cls
+    model_cls, _worker_recognizer_cls, _ = _load_backend(model_path, use_stub)
+    _worker_model = model_cls(model_path)
+
+
+def _throughput_job(path):
+    chunks = [bytes(c) for c in iter_pcm_chunks(path)]
+    _recognize(_worker_model, _worker_recognizer_cls, chunks)
+    return _audio_seconds(chunks)
+
+
+def measure_stage(stage, files, model_path, use_stub, repeat):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        raw = pool.submit(_stage_worker, stage, files, model_path, use_stub, repeat).result()
+
+    latencies = raw["latencies"]
+    total_audio = sum(raw["audio_seconds"])
+    peak_delta = (max(0, raw["peak_rss"] - raw["baseline_rss"])
+                  if raw["peak_rss"] is not None and raw["baseline_rss"] is not None else None)
+    return {
+        "stage": stage,
+        "backend": raw["backend"],
+        "runs": len(latencies),
+        "p50_s": _percentile(latencies, 50),
+        "p95_s": _percentile(latencies, 95),
+        "rtf": sum(latencies) / total_audio if total_audio else None,
+        "peak_rss_mb": raw["peak_rss"] / 2**20 if raw["peak_rss"] else None,
+        "peak_rss_delta_mb": peak_delta / 2**20 if peak_delta is not None else None,
+    }
+
+
+def measure_throughput(files, model_path, use_stub, repeat, concurrency):
+    jobs = files * repeat
+    with ProcessPoolExecutor(max_workers=concurrency, initializer=_throughput_init,
+                             initargs=(model_path, use_stub)) as pool:
+        # Warm every worker before timing
+        list(pool.map(_throughput_job, files[:1] * concurrency))
+        started = time.perf_counter()
+        audio_seconds = sum(pool.map(_throughput_job, jobs))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "jobs": len(jobs),
+        "jobs_per_s": len(jobs) / elapsed,
+        "audio_s_per_s": audio_seconds / elapsed,
+    }
+
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH,
+                        help="Vosk model directory (default: $VOSK_MODEL_PATH)")
+    parser.add_argument("--files", nargs="*",
+                        help="Audio files (default: the bundled *.wav recordings)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-concurrency", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--stub", action="store_true", help="Force the stub recognizer")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(REPO_ROOT, "*.wav")))
+    if not files:
+        parser.error("no audio files found")
+
+    stages = [measure_stage(stage, files, args.model, args.stub, args.repeat)
+              for stage in ("model_load", "decode", "recognition")]
+
+    print(f"backend: {stages[0]['backend']}   files: {len(files)}   repeat: {args.repeat}")
+    print(f"{'stage':<12} {'runs':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'RTF':>8} "
+          f"{'peak RSS':>10} {'Δ RSS':>9}")
+    for s in stages:
+        print(f"{s['stage']:<12} {s['runs']:>5} {s['p50_s']:>9.4f} {s['p95_s']:>9.4f} "
+              f"{_fmt(s['rtf'], '8.4f'):>8} {_fmt(s['peak_rss_mb'], '8.1f'):>8}MB "
+              f"{_fmt(s['peak_rss_delta_mb'], '7.1f'):>7}MB")
+
+    throughput = []
+    concurrency = 1
+    while concurrency <= args.max_concurrency:
+        throughput.append(measure_throughput(files, args.model, args.stub, args.repeat,
+                                             concurrency))
+        concurrency *= 2
+    if throughput[-1]["concurrency"] != args.max_concurrency:
+        throughput.append(measure_throughput(files, args.model, args.stub, args.repeat,
+                                             args.max_concurrency))
+
+    print()
+    print(f"{'workers':>7} {'jobs/s':>9} {'audio s/s':>10}")
+    for t in throughput:
+        print(f"{t['concurrency']:>7} {t['jobs_per_s']:>9.2f} {t['audio_s_per_s']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"files": files, "stages": stages, "throughput": throughput}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,552 @@
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from transcript import Transcript
+
+DB_PATH = 'user_data.db'
+
+# Schema migrations, each a list of statements applied in order. PRAGMA
+# user_version records how many have run, so each executes once per file.
+MIGRATIONS = [
+    # 1: original tables created by app.py
+    [
+        '''CREATE TABLE IF NOT EXISTS user_main (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            email TEXT,
+            password TEXT,
+            dob TEXT,
+            sex TEXT,
+            height REAL,
+            weight REAL,
+            nationality TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS user_sessions (
+            session_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            input_text TEXT,
+            retrieved_data TEXT,
+            FOREIGN KEY (user_id) REFERENCES user_main (id)
+        )''',
+    ],
+    # 2: logins look users up by email
+    [
+        'CREATE INDEX IF NOT EXISTS idx_user_main_email ON user_main (email)',
+    ],
+    # 3: timestamps and an index for paginated per-user history
+    [
+        'ALTER TABLE user_sessions ADD COLUMN created_at TEXT',
+        "UPDATE user_sessions SET created_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+        'WHERE created_at IS NULL',
+        '''CREATE INDEX IF NOT EXISTS idx_user_sessions_user_created
+           ON user_sessions (user_id, created_at, session_id)''',
+    ],
+    # 4: full-text index over transcripts, kept in sync by triggers
+    [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS user_sessions_fts USING fts5(
+               input_text,
+               content='user_sessions',
+               content_rowid='session_id',
+               tokenize='porter unicode61'
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS user_sessions_fts_ai AFTER INSERT ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (rowid, input_text)
+               VALUES (new.session_id, new.input_text);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS user_sessions_fts_ad AFTER DELETE ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (user_sessions_fts, rowid, input_text)
+               VALUES ('delete', old.session_id, old.input_text);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS user_sessions_fts_au AFTER UPDATE OF input_text ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (user_sessions_fts, rowid, input_text)
+               VALUES ('delete', old.session_id, old.input_text);
+               INSERT INTO user_sessions_fts (rowid, input_text)
+               VALUES (new.session_id, new.input_text);
+           END''',
+        # Index rows that existed before this migration
+        "INSERT INTO user_sessions_fts (user_sessions_fts) VALUES ('rebuild')",
+    ],
+    # 5: structured transcript (word timings) alongside the plain text
+    [
+        'ALTER TABLE user_sessions ADD COLUMN transcript_json TEXT',
+    ],
+    # 6: progress of offline batch runs, so an interrupted run can resume
+    [
+        '''CREATE TABLE IF NOT EXISTS batch_files (
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            session_id INTEGER,
+            audio_seconds REAL,
+            error TEXT,
+            finished_at TEXT,
+            PRIMARY KEY (path, size, mtime_ns),
+            FOREIGN KEY (session_id) REFERENCES user_sessions (session_id)
+        )''',
+    ],
+    # 7: archived recordings (see archive.py), keyed by the SHA-256 of their
+    # audio, and the recording each session was transcribed from
+    [
+        '''CREATE TABLE IF NOT EXISTS recordings (
+            recording_id TEXT PRIMARY KEY,
+            sample_rate INTEGER NOT NULL,
+            frames INTEGER NOT NULL,
+            original_bytes INTEGER,
+            archived_bytes INTEGER NOT NULL,
+            created_at TEXT
+        )''',
+        'ALTER TABLE user_sessions ADD COLUMN recording_id TEXT REFERENCES recordings (recording_id)',
+        '''CREATE INDEX IF NOT EXISTS idx_user_sessions_recording
+           ON user_sessions (recording_id)''',
+    ],
+    # 8: the owner in the full-text index (superseded by 9)
+    [
+        'DROP TRIGGER IF EXISTS user_sessions_fts_ai',
+        'DROP TRIGGER IF EXISTS user_sessions_fts_ad',
+        'DROP TRIGGER IF EXISTS user_sessions_fts_au',
+        'DROP TABLE IF EXISTS user_sessions_fts',
+        '''CREATE VIRTUAL TABLE user_sessions_fts USING fts5(
+               input_text,
+               user_id UNINDEXED,
+               content='user_sessions',
+               content_rowid='session_id',
+               tokenize='porter unicode61'
+           )''',
+        '''CREATE TRIGGER user_sessions_fts_ai AFTER INSERT ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (rowid, input_text, user_id)
+               VALUES (new.session_id, new.input_text, new.user_id);
+           END''',
+        '''CREATE TRIGGER user_sessions_fts_ad AFTER DELETE ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (user_sessions_fts, rowid, input_text, user_id)
+               VALUES ('delete', old.session_id, old.input_text, old.user_id);
+           END''',
+        '''CREATE TRIGGER user_sessions_fts_au AFTER UPDATE OF input_text, user_id
+           ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (user_sessions_fts, rowid, input_text, user_id)
+               VALUES ('delete', old.session_id, old.input_text, old.user_id);
+               INSERT INTO user_sessions_fts (rowid, input_text, user_id)
+               VALUES (new.session_id, new.input_text, new.user_id);
+           END''',
+        "INSERT INTO user_sessions_fts (user_sessions_fts) VALUES ('rebuild')",
+    ],
+    # 9: the owner as an indexed column. An UNINDEXED one cannot be matched,
+    # so filtering on it still scanned every user's hits; as a column filter
+    # in the MATCH expression only the searching user's rows are visited.
+    [
+        'DROP TRIGGER IF EXISTS user_sessions_fts_ai',
+        'DROP TRIGGER IF EXISTS user_sessions_fts_ad',
+        'DROP TRIGGER IF EXISTS user_sessions_fts_au',
+        'DROP TABLE IF EXISTS user_sessions_fts',
+        '''CREATE VIRTUAL TABLE user_sessions_fts USING fts5(
+               input_text,
+               user_id,
+               content='user_sessions',
+               content_rowid='session_id',
+               tokenize='porter unicode61'
+           )''',
+        '''CREATE TRIGGER user_sessions_fts_ai AFTER INSERT ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (rowid, input_text, user_id)
+               VALUES (new.session_id, new.input_text, new.user_id);
+           END''',
+        '''CREATE TRIGGER user_sessions_fts_ad AFTER DELETE ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (user_sessions_fts, rowid, input_text, user_id)
+               VALUES ('delete', old.session_id, old.input_text, old.user_id);
+           END''',
+        '''CREATE TRIGGER user_sessions_fts_au AFTER UPDATE OF input_text, user_id
+           ON user_sessions BEGIN
+               INSERT INTO user_sessions_fts (user_sessions_fts, rowid, input_text, user_id)
+               VALUES ('delete', old.session_id, old.input_text, old.user_id);
+               INSERT INTO user_sessions_fts (rowid, input_text, user_id)
+               VALUES (new.session_id, new.input_text, new.user_id);
+           END''',
+        "INSERT INTO user_sessions_fts (user_sessions_fts) VALUES ('rebuild')",
+    ],
+]
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache prepares each one once and reuses it on every call.
+_SQL_INSERT_USER = '''
+    INSERT INTO user_main (username, email, password, dob, sex, height, weight, nationality)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_FIND_USER = 'SELECT * FROM user_main WHERE email = ? AND password = ?'
+_SQL_INSERT_SESSION = '''
+    INSERT INTO user_sessions
+        (user_id, input_text, retrieved_data, transcript_json, recording_id, created_at)
+    VALUES (?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+'''
+_SQL_SESSIONS_FIRST_PAGE = '''
+    SELECT session_id, input_text, created_at
+    FROM user_sessions
+    WHERE user_id = ?
+    ORDER BY created_at DESC, session_id DESC
+    LIMIT ?
+'''
+_SQL_SESSIONS_NEXT_PAGE = '''
+    SELECT session_id, input_text, created_at
+    FROM user_sessions
+    WHERE user_id = ? AND (created_at, session_id) < (?, ?)
+    ORDER BY created_at DESC, session_id DESC
+    LIMIT ?
+'''
+_SQL_INSERT_BATCH_FILE = '''
+    INSERT OR REPLACE INTO batch_files
+        (path, size, mtime_ns, status, session_id, audio_seconds, error, finished_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+'''
+_SQL_BATCH_FILES = 'SELECT path, size, mtime_ns, status FROM batch_files'
+_SQL_SESSION_TRANSCRIPT = 'SELECT transcript_json FROM user_sessions WHERE session_id = ?'
+_SQL_INSERT_RECORDING = '''
+    INSERT OR IGNORE INTO recordings
+        (recording_id, sample_rate, frames, original_bytes, archived_bytes, created_at)
+    VALUES (?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+'''
+_SQL_SESSION_RECORDING = 'SELECT recording_id FROM user_sessions WHERE session_id = ?'
+_SQL_SET_SESSION_RECORDING = 'UPDATE user_sessions SET recording_id = ? WHERE session_id = ?'
+_SQL_SEARCH_SESSIONS = '''
+    SELECT s.session_id,
+           s.created_at,
+           snippet(user_sessions_fts, 0, ?, ?, ' … ', 16),
+           bm25(user_sessions_fts, 1.0, 0.0)
+    FROM user_sessions_fts
+    JOIN user_sessions AS s ON s.session_id = user_sessions_fts.rowid
+    WHERE user_sessions_fts MATCH ?
+    ORDER BY bm25(user_sessions_fts, 1.0, 0.0)
+    LIMIT ?
+'''
+
+
+def _configure(conn):
+    """Per-connection settings: WAL lets readers run alongside a writer."""
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.execute('PRAGMA busy_timeout=5000')
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """
+    Bring the schema up to date.
+
+    Args:
+        conn (sqlite3.Connection): Connection to migrate.
+        migrations (list): Migration list to apply, MIGRATIONS by default.
+
+    Returns:
+        int: Schema version after migrating.
+    """
+    # BEGIN IMMEDIATE takes the write lock so two processes cannot both
+    # apply the same migration.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, statements in enumerate(migrations[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections.
+
+    Connections are opened lazily up to max_size and handed out one per
+    caller, so concurrent Streamlit sessions no longer share a single cursor.
+    The schema is migrated once, when the first connection is opened.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_size=8, timeout=30, migrations=None):
+        self.db_path = db_path
+        self.migrations = MIGRATIONS if migrations is None else migrations
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
+        _configure(conn)
+        if not self._migrated:
+            migrate(conn, self.migrations)
+            self._migrated = True
+        return conn
+
+    def acquire(self):
+        """Take a connection, opening a new one or waiting if the pool is exhausted."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                conn = self._open()
+                self._created += 1
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Context manager yielding a pooled connection inside a transaction."""
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(db_path=DB_PATH):
+    """Return the process-wide connection pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(db_path)
+        return _pool
+
+
+def create_user(username, email, password, dob, sex, height, weight, nationality):
+    """
+    Insert a new row into user_main.
+
+    Returns:
+        int: The new user's id.
+    """
+    with get_pool().transaction() as conn:
+        cur = conn.execute(_SQL_INSERT_USER,
+                           (username, email, password, dob, sex, height, weight, nationality))
+        return cur.lastrowid
+
+
+def find_user(email, password):
+    """
+    Look up a user by credentials.
+
+    Returns:
+        tuple: The user_main row, or None if no user matches.
+    """
+    with get_pool().connection() as conn:
+        return conn.execute(_SQL_FIND_USER, (email, password)).fetchone()
+
+
+def save_session(user_id, input_text, retrieved_data=None, transcript=None, recording_id=None):
+    """
+    Store a transcript or manual input for a user.
+
+    Args:
+        transcript (Transcript): Word-level result to keep with the text, so
+            captions can be produced later without re-running recognition.
+        recording_id (str): Archived recording the transcript came from, as
+            registered with save_recording().
+
+    Returns:
+        int: The new session_id.
+    """
+    transcript_json = transcript.to_json() if transcript is not None else None
+    with get_pool().transaction() as conn:
+        cur = conn.execute(_SQL_INSERT_SESSION,
+                           (user_id, input_text, retrieved_data, transcript_json, recording_id))
+        return cur.lastrowid
+
+
+def save_recording(recording_id, sample_rate, frames, original_bytes, archived_bytes):
+    """Register an archived recording. Registering the same one again does nothing."""
+    with get_pool().transaction() as conn:
+        conn.execute(_SQL_INSERT_RECORDING,
+                     (recording_id, sample_rate, frames, original_bytes, archived_bytes))
+
+
+def set_session_recording(session_id, recording_id):
+    """Link a saved session to the archived recording it was transcribed from."""
+    with get_pool().transaction() as conn:
+        conn.execute(_SQL_SET_SESSION_RECORDING, (recording_id, session_id))
+
+
+def get_session_recording(session_id):
+    """
+    Find the archived recording a session was transcribed from.
+
+    Returns:
+        str: Its recording_id, or None if the session has no recording.
+    """
+    with get_pool().connection() as conn:
+        row = conn.execute(_SQL_SESSION_RECORDING, (session_id,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def save_batch_results(user_id, results):
+    """
+    Store a batch of offline transcription results in one transaction.
+
+    Each file's session row and its batch_files progress row commit
+    together, so after a crash a file is either fully recorded or redone.
+
+    Args:
+        user_id (int): Owner of the new sessions.
+        results (list[dict]): Items with path, size, mtime_ns, audio_seconds,
+            and either transcript (Transcript) or error (str).
+
+    Returns:
+        int: Number of sessions created.
+    """
+    created = 0
+    with get_pool().transaction() as conn:
+        for result in results:
+            transcript = result.get('transcript')
+            session_id = None
+            if transcript is not None and transcript.text:
+                session_id = conn.execute(
+                    _SQL_INSERT_SESSION,
+                    (user_id, transcript.text, None, transcript.to_json(), None)).lastrowid
+                created += 1
+            status = 'failed' if result.get('error') else 'done'
+            conn.execute(_SQL_INSERT_BATCH_FILE,
+                         (result['path'], result['size'], result['mtime_ns'], status,
+                          session_id, result.get('audio_seconds'), result.get('error')))
+    return created
+
+
+def get_batch_progress():
+    """
+    Load the recorded outcome of every file seen by batch runs.
+
+    Returns:
+        dict: (path, size, mtime_ns) -> 'done' or 'failed'.
+    """
+    with get_pool().connection() as conn:
+        return {(path, size, mtime_ns): status
+                for path, size, mtime_ns, status in conn.execute(_SQL_BATCH_FILES)}
+
+
+def get_session_transcript(session_id):
+    """
+    Load the stored word-level transcript for a session.
+
+    Returns:
+        Transcript: The transcript, or None if only plain text was saved.
+    """
+    with get_pool().connection() as conn:
+        row = conn.execute(_SQL_SESSION_TRANSCRIPT, (session_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return Transcript.from_json(row[0])
+
+
+def get_user_sessions(user_id, limit=20, before=None):
+    """
+    Fetch one page of a user's history, newest first.
+
+    Uses keyset pagination on the (user_id, created_at, session_id) index, so
+    each page costs the same no matter how deep into the history it is.
+
+    Args:
+        user_id (int): Owner of the sessions.
+        limit (int): Maximum rows to return.
+        before (tuple): Cursor returned with the previous page, or None for
+            the first page.
+
+    Returns:
+        tuple: (rows, next_cursor) where rows are (session_id, input_text,
+        created_at) tuples and next_cursor is None when there are no more pages.
+    """
+    with get_pool().connection() as conn:
+        if before is None:
+            rows = conn.execute(_SQL_SESSIONS_FIRST_PAGE, (user_id, limit)).fetchall()
+        else:
+            created_at, session_id = before
+            rows = conn.execute(_SQL_SESSIONS_NEXT_PAGE,
+                                (user_id, created_at, session_id, limit)).fetchall()
+
+    next_cursor = (rows[-1][2], rows[-1][0]) if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def build_match_query(text):
+    """
+    Turn free text typed by a user into a safe FTS5 MATCH expression.
+
+    Every word is quoted so FTS5 operators in the input cannot cause syntax
+    errors, words are ANDed together, and the last word is matched as a
+    prefix so results appear while the user is still typing.
+
+    Returns:
+        str: The MATCH expression, or None if text has no searchable words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_sessions(user_id, text, limit=20, highlight=('**', '**')):
+    """
+    Full-text search over a user's saved transcripts.
+
+    Args:
+        user_id (int): Owner of the transcripts.
+        text (str): Search text as typed by the user.
+        limit (int): Maximum number of results.
+        highlight (tuple): Markers placed before and after matched terms.
+
+    Returns:
+        list[tuple]: (session_id, created_at, snippet, score) tuples, best
+        match first. Lower scores are better matches.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+    # The owner is matched inside the FTS query, so only their rows are read;
+    # the search terms are kept to the transcript column
+    match = f'user_id:"{int(user_id)}" AND input_text:({match})'
+    with get_pool().connection() as conn:
+        return conn.execute(_SQL_SEARCH_SESSIONS,
+                            (highlight[0], highlight[1], match, limit)).fetchall()
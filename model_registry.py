@@ -0,0 +1,193 @@
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module
+    resource = None
+
+
+def _current_rss_bytes():
+    """
+    Best-effort resident set size of the current process.
+    Returns the RSS in bytes, or None if it cannot be determined on this platform.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if resource is not None:
+        # ru_maxrss is the peak, not the current value, but it is the best we have
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    return None
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded Vosk models.
+
+    Each model directory is loaded at most once per process and the same
+    Model instance is handed to every Streamlit session and thread that asks
+    for it. Vosk models are read-only after loading, so sharing them is safe.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._background = {}
+
+    @staticmethod
+    def _key(model_path):
+        return os.path.abspath(model_path)
+
+    def get(self, model_path):
+        """
+        Return the loaded model for model_path, loading it on first use.
+
+        Args:
+            model_path (str): Path to the Vosk model directory.
+
+        Returns:
+            vosk.Model: The shared model instance.
+        """
+        key = self._key(model_path)
+
+        model = self._cached(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given path; others wait for it instead of
+        # loading a second copy. Different paths can still load in parallel.
+        with load_lock:
+            model = self._cached(key)
+            if model is not None:
+                return model
+
+            if not os.path.exists(model_path):
+                raise ValueError(f"Model path '{model_path}' does not exist.")
+
+            # Imported here so processes that never transcribe skip loading vosk
+            from vosk import Model
+
+            rss_before = _current_rss_bytes()
+            started = time.perf_counter()
+            model = Model(model_path)
+            load_seconds = time.perf_counter() - started
+            rss_after = _current_rss_bytes()
+
+            with self._lock:
+                self._models[key] = model
+                self._stats[key] = {
+                    "model_path": key,
+                    "load_seconds": load_seconds,
+                    "rss_delta_bytes": (rss_after - rss_before
+                                        if rss_before is not None and rss_after is not None
+                                        else None),
+                    "rss_after_bytes": rss_after,
+                    "loaded_at": time.time(),
+                    "hits": 0,
+                }
+            return model
+
+    def _cached(self, key):
+        """Return the loaded model for key, counting a hit, or None."""
+        # Looked up under the lock so a concurrent unload() cannot remove
+        # the stats entry between finding the model and counting the hit
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._stats[key]["hits"] += 1
+            return model
+
+    def preload(self, *model_paths):
+        """
+        Load models ahead of the first request so no user pays the load cost.
+        Failures are reported and skipped rather than raised.
+
+        Returns:
+            dict: Mapping of model path to True/False for load success.
+        """
+        loaded = {}
+        for model_path in model_paths:
+            try:
+                self.get(model_path)
+                loaded[model_path] = True
+            except Exception as e:
+                print(f"Error preloading model '{model_path}': {e}")
+                loaded[model_path] = False
+        return loaded
+
+    def preload_in_background(self, *model_paths):
+        """
+        Start preload() on a daemon thread, at most once per set of paths,
+        so the caller is not held up by model loading. Anyone who needs a
+        model before it is ready waits on the same load in get().
+
+        Returns:
+            threading.Thread: The loading thread.
+        """
+        key = tuple(self._key(path) for path in model_paths)
+        with self._lock:
+            thread = self._background.get(key)
+            if thread is None:
+                thread = threading.Thread(target=self.preload, args=model_paths,
+                                          name="model-preload", daemon=True)
+                self._background[key] = thread
+                thread.start()
+        return thread
+
+    def is_loaded(self, model_path):
+        return self._key(model_path) in self._models
+
+    def unload(self, model_path):
+        """Drop a model from the cache so its memory can be reclaimed."""
+        key = self._key(model_path)
+        with self._lock:
+            self._models.pop(key, None)
+            self._stats.pop(key, None)
+
+    def stats(self):
+        """
+        Return load time, memory and hit statistics for every loaded model.
+
+        Returns:
+            list[dict]: One entry per loaded model.
+        """
+        with self._lock:
+            return [dict(entry) for entry in self._stats.values()]
+
+
+# Shared by every session and thread in this process
+default_registry = ModelRegistry()
+
+
+def get_model(model_path):
+    """Return the process-wide cached Vosk model for model_path."""
+    return default_registry.get(model_path)
+
+
+def preload_models(*model_paths):
+    """Pre-warm the process-wide registry, e.g. when the app starts."""
+    return default_registry.preload(*model_paths)
+
+
+def preload_models_in_background(*model_paths):
+    """Pre-warm the process-wide registry without blocking the caller."""
+    return default_registry.preload_in_background(*model_paths)
+
+
+def model_stats():
+    """Return statistics for every model loaded in this process."""
+    return default_registry.stats()
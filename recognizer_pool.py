@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from model_registry import get_model
+
+RecognizerKey = namedtuple("RecognizerKey", ["model_path", "sample_rate", "words",
+                                             "partial_words", "max_alternatives", "grammar"])
+
+
+def _create_recognizer(key):
+    """Build a KaldiRecognizer configured for key on the shared model."""
+    from vosk import KaldiRecognizer
+
+    model = get_model(key.model_path)
+    if key.grammar is not None:
+        recognizer = KaldiRecognizer(model, key.sample_rate, key.grammar)
+    else:
+        recognizer = KaldiRecognizer(model, key.sample_rate)
+    recognizer.SetWords(key.words)
+    if key.partial_words:
+        recognizer.SetPartialWords(True)
+    if key.max_alternatives:
+        recognizer.SetMaxAlternatives(key.max_alternatives)
+    return recognizer
+
+
+def _buffer_acceptor(recognizer):
+    """
+    Return a function feeding a contiguous buffer to a vosk KaldiRecognizer
+    without copying it, or None for other recognizers. The Python binding's
+    own AcceptWaveform() only takes bytes.
+    """
+    try:
+        from vosk import KaldiRecognizer, _c, _ffi
+    except ImportError:
+        return None
+    if not isinstance(recognizer, KaldiRecognizer):
+        return None
+
+    def accept(view):
+        result = _c.vosk_recognizer_accept_waveform(recognizer._handle, _ffi.from_buffer(view),
+                                                    view.nbytes)
+        if result < 0:
+            raise Exception("Failed to process waveform")
+        return result
+
+    return accept
+
+
+class PooledRecognizer:
+    """
+    A KaldiRecognizer checked out of a RecognizerPool.
+
+    Vosk keeps counting time across utterances, so a reused recognizer
+    reports word times from the start of everything it has ever been fed.
+    Every use is closed with FinalResult(), after which Vosk restarts its
+    pipeline at exactly the number of samples fed so far. This wrapper
+    records that sample count and subtracts it from the times it returns,
+    so each use sees times starting at zero, as with a new recognizer.
+    """
+
+    def __init__(self, recognizer, key):
+        self.key = key
+        self._recognizer = recognizer
+        self._base_samples = 0
+        self._fed_samples = 0
+        self._accept_buffer = _buffer_acceptor(recognizer)
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    def AcceptWaveform(self, data):
+        view = memoryview(data)
+        # int16 mono: two bytes per sample
+        self._fed_samples += view.nbytes // 2
+        if self._accept_buffer is not None and view.c_contiguous:
+            # Memory-mapped WAV blocks reach Vosk without being copied
+            return self._accept_buffer(view)
+        return self._recognizer.AcceptWaveform(data if isinstance(data, bytes) else bytes(view))
+
+    def Result(self):
+        return self._rebase(self._recognizer.Result())
+
+    def PartialResult(self):
+        return self._rebase(self._recognizer.PartialResult())
+
+    def FinalResult(self):
+        return self._rebase(self._recognizer.FinalResult())
+
+    def _rebase(self, text):
+        if self._base_samples == 0:
+            return text
+        offset = self._base_samples / self.key.sample_rate
+        result = json.loads(text)
+        words = list(result.get("result", [])) + list(result.get("partial_result", []))
+        for alternative in result.get("alternatives", []):
+            words.extend(alternative.get("result", []))
+        if not words:
+            return text
+        for word in words:
+            word["start"] = round(word["start"] - offset, 6)
+            word["end"] = round(word["end"] - offset, 6)
+        return json.dumps(result)
+
+    def _finish(self):
+        """Close the current use so the next one starts from a clean state."""
+        self._recognizer.FinalResult()
+        self._base_samples = self._fed_samples
+        self.uses += 1
+        self.last_used = time.monotonic()
+
+
+class RecognizerPool:
+    """
+    Reusable recognizers keyed by model, sample rate and options.
+
+    acquire() hands out an idle recognizer for the key if there is one and
+    builds a new one otherwise; release() finishes the recognizer's current
+    utterance and keeps it for the next caller. At most max_in_use_per_key
+    recognizers per key are checked out at once; further acquire() calls
+    wait for one to be released. At most max_idle_per_key recognizers per
+    key and max_idle in total are kept between uses, and recognizers unused
+    for idle_timeout seconds are dropped.
+    """
+
+    def __init__(self, max_in_use_per_key=8, max_idle_per_key=4, max_idle=32,
+                 idle_timeout=300.0, recognizer_factory=_create_recognizer):
+        self.max_in_use_per_key = max_in_use_per_key
+        self.max_idle_per_key = max_idle_per_key
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._factory = recognizer_factory
+        self._idle = {}
+        self._idle_count = 0
+        self._slots = {}
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.evicted = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waited = 0
+        self.create_seconds = 0.0
+
+    @staticmethod
+    def make_key(model_path, sample_rate=16000, words=True, partial_words=False,
+                 max_alternatives=0, grammar=None):
+        return RecognizerKey(os.path.abspath(model_path), int(sample_rate), bool(words),
+                             bool(partial_words), int(max_alternatives), grammar)
+
+    def acquire(self, model_path, sample_rate=16000, words=True, partial_words=False,
+                max_alternatives=0, grammar=None, timeout=None):
+        """
+        Check out a recognizer. Return it with release() when done.
+
+        Blocks while max_in_use_per_key recognizers for the key are checked
+        out.
+
+        Args:
+            model_path (str): Path to the Vosk model directory.
+            sample_rate (int): Rate of the audio that will be fed.
+            words (bool): Include word timings in results.
+            partial_words (bool): Include word timings in partial results.
+            max_alternatives (int): N-best alternatives, 0 for one result.
+            grammar (str): JSON list of phrases to restrict recognition to.
+            timeout (float): Seconds to wait for a free slot, None to wait
+                indefinitely.
+
+        Returns:
+            PooledRecognizer: A recognizer with no audio pending.
+
+        Raises:
+            TimeoutError: No recognizer for the key was released in time.
+        """
+        key = self.make_key(model_path, sample_rate, words, partial_words, max_alternatives,
+                            grammar)
+        with self._lock:
+            slots = self._slots.get(key)
+            if slots is None:
+                slots = self._slots[key] = threading.BoundedSemaphore(self.max_in_use_per_key)
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self.waited += 1
+            if not slots.acquire(timeout=timeout):
+                raise TimeoutError(f"All {self.max_in_use_per_key} recognizers for "
+                                   f"{key.model_path} at {key.sample_rate} Hz are in use")
+
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            idle = self._idle.get(key)
+            recognizer = idle.pop() if idle else None
+            if recognizer is not None:
+                self._idle_count -= 1
+                self.reused += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+        if recognizer is None:
+            started = time.perf_counter()
+            try:
+                recognizer = PooledRecognizer(self._factory(key), key)
+            except Exception:
+                with self._lock:
+                    self.in_use -= 1
+                slots.release()
+                raise
+            with self._lock:
+                self.created += 1
+                self.create_seconds += time.perf_counter() - started
+        return recognizer
+
+    def release(self, recognizer, discard=False):
+        """
+        Return a recognizer to the pool.
+
+        Args:
+            recognizer (PooledRecognizer): From acquire().
+            discard (bool): Drop it instead, e.g. after an error left it in
+                an unknown state.
+        """
+        if not discard:
+            try:
+                recognizer._finish()
+            except Exception:
+                discard = True
+
+        with self._lock:
+            self.in_use -= 1
+            slots = self._slots[recognizer.key]
+            idle = self._idle.setdefault(recognizer.key, deque())
+            if discard or len(idle) >= self.max_idle_per_key or self._idle_count >= self.max_idle:
+                self.discarded += 1
+            else:
+                idle.append(recognizer)
+                self._idle_count += 1
+        slots.release()
+
+    @contextmanager
+    def recognizer(self, model_path, sample_rate=16000, **options):
+        """Context manager around acquire()/release()."""
+        recognizer = self.acquire(model_path, sample_rate, **options)
+        failed = False
+        try:
+            yield recognizer
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also reached when an enclosing generator is closed early; the
+            # recognizer is still healthy then and goes back to the pool
+            self.release(recognizer, discard=failed)
+
+    def _evict_idle(self, now):
+        """Drop recognizers idle for longer than idle_timeout. Caller holds the lock."""
+        for key in list(self._idle):
+            idle = self._idle[key]
+            # Oldest first: release() appends and acquire() pops the newest
+            while idle and now - idle[0].last_used > self.idle_timeout:
+                idle.popleft()
+                self._idle_count -= 1
+                self.evicted += 1
+            if not idle:
+                del self._idle[key]
+
+    def evict_idle(self):
+        """Drop recognizers that have been idle for longer than idle_timeout."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def stats(self):
+        """Return reuse and utilization counters."""
+        with self._lock:
+            checkouts = self.created + self.reused
+            return {
+                "keys": len(self._idle),
+                "idle": self._idle_count,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "waited": self.waited,
+                "created": self.created,
+                "reused": self.reused,
+                "reuse_rate": self.reused / checkouts if checkouts else 0.0,
+                "discarded": self.discarded,
+                "evicted": self.evicted,
+                "avg_create_seconds": self.create_seconds / self.created if self.created else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_recognizer_pool():
+    """Return the process-wide recognizer pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RecognizerPool()
+        return _pool
+
+
+def pooled_recognizer(model_path, sample_rate=16000, **options):
+    """Check a recognizer out of the process-wide pool for a with block."""
+    return get_recognizer_pool().recognizer(model_path, sample_rate, **options)
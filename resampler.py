@@ -0,0 +1,170 @@
+from math import gcd
+
+import numpy as np
+
+# Zero crossings of the windowed-sinc filter on each side of its centre, in
+# units of the slower of the two rates, and the Kaiser window shape. These
+# are the defaults of scipy.signal.resample_poly.
+HALF_TAPS = 10
+KAISER_BETA = 5.0
+
+
+def design_filter(up, down, half_taps=HALF_TAPS, beta=KAISER_BETA):
+    """
+    Low-pass FIR filter for resampling by up/down, at the upsampled rate.
+
+    The cutoff is the Nyquist frequency of the slower rate, and the gain is
+    up so that zero-stuffed input keeps its level.
+
+    Returns:
+        numpy.ndarray: 2 * half_taps * max(up, down) + 1 float64 taps.
+    """
+    max_rate = max(up, down)
+    half_len = half_taps * max_rate
+    cutoff = 0.5 / max_rate
+    n = np.arange(-half_len, half_len + 1)
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(2 * half_len + 1, beta)
+    return taps * (up / taps.sum())
+
+
+def pcm_to_mono(data, channels, sample_width):
+    """
+    Decode interleaved little-endian PCM and average the channels.
+
+    8-bit samples are unsigned, as in WAV files; wider ones are signed.
+
+    Returns:
+        numpy.ndarray: float32 mono samples on the int16 scale.
+    """
+    if sample_width == 1:
+        samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128) * 256
+    elif sample_width == 2:
+        samples = np.frombuffer(data, "<i2").astype(np.float32)
+    elif sample_width == 3:
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+        # Assemble in the top three bytes so the sign bit lands in place
+        samples = ((raw[:, 0] << 8) | (raw[:, 1] << 16) | (raw[:, 2] << 24)).astype(np.float32)
+        samples /= 65536
+    elif sample_width == 4:
+        samples = np.frombuffer(data, "<i4").astype(np.float32) / 65536
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def to_pcm16(samples):
+    """Round float samples on the int16 scale to little-endian int16 bytes."""
+    return np.clip(np.rint(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler for mono float signals.
+
+    Resamples by up/down = to_rate/from_rate with a windowed-sinc FIR filter
+    evaluated in polyphase form: each output sample needs only the filter
+    taps that line up with real input samples, about 2 * half_taps *
+    max(up, down) / up of them, instead of filtering the zero-stuffed signal.
+
+    Blocks may be any length. The resampler keeps the input it still needs
+    between blocks, so feeding a signal in pieces gives the same output as
+    feeding it whole, and the filter delay is compensated so output sample n
+    lines up with time n / to_rate. Call flush() at the end of the stream
+    for the last samples.
+    """
+
+    def __init__(self, from_rate, to_rate, half_taps=HALF_TAPS, beta=KAISER_BETA):
+        divisor = gcd(int(from_rate), int(to_rate))
+        self.up = int(to_rate) // divisor
+        self.down = int(from_rate) // divisor
+
+        taps = design_filter(self.up, self.down, half_taps, beta)
+        self._delay = (len(taps) - 1) // 2
+        self._width = -(-len(taps) // self.up)
+        taps = np.concatenate([taps, np.zeros(self._width * self.up - len(taps))])
+        # _phases[p, k] weighs input sample i0 - k for outputs of phase p;
+        # reversed so it lines up with windows ordered oldest first
+        self._phases = taps.reshape(self._width, self.up).T[:, ::-1].astype(np.float32)
+
+        # Input samples from global index _start onwards; zeros before the start
+        self._buffer = np.zeros(self._width, np.float32)
+        self._start = -self._width
+        self._consumed = 0
+        self._produced = 0
+
+    def _emit(self, last_output):
+        """Compute outputs _produced..last_output from the buffered input."""
+        if last_output < self._produced:
+            return np.zeros(0, np.float32)
+        positions = np.arange(self._produced, last_output + 1) * self.down + self._delay
+        newest = positions // self.up - self._start
+        windows = np.lib.stride_tricks.sliding_window_view(self._buffer, self._width)
+        output = np.einsum("nk,nk->n", windows[newest - self._width + 1],
+                           self._phases[positions % self.up])
+        self._produced = last_output + 1
+
+        # Drop input that no later output reaches back to
+        next_newest = (self._produced * self.down + self._delay) // self.up
+        keep_from = min(next_newest - self._width + 1, self._consumed) - self._start
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._start += keep_from
+        return output
+
+    def process(self, samples):
+        """
+        Feed input samples.
+
+        Returns:
+            numpy.ndarray: Every float32 output sample that can be computed
+            so far.
+        """
+        samples = np.asarray(samples, np.float32)
+        self._buffer = np.concatenate([self._buffer, samples])
+        self._consumed += len(samples)
+        # Outputs whose newest input sample has arrived
+        last_output = (self._consumed * self.up - 1 - self._delay) // self.down
+        return self._emit(last_output)
+
+    def flush(self):
+        """
+        End the stream, padding it with silence.
+
+        Returns:
+            numpy.ndarray: The remaining output, so the total is
+            ceil(input_samples * up / down) samples.
+        """
+        total = -(-self._consumed * self.up // self.down)
+        self._buffer = np.concatenate([self._buffer,
+                                       np.zeros(self._delay // self.up + 1, np.float32)])
+        return self._emit(total - 1)
+
+
+class PCMConverter:
+    """
+    Converts a stream of PCM blocks of any rate, width and channel count to
+    16-bit mono at to_rate, block by block.
+
+    Every block must hold whole frames.
+    """
+
+    def __init__(self, channels, sample_width, from_rate, to_rate):
+        self.channels = channels
+        self.sample_width = sample_width
+        self._resampler = (PolyphaseResampler(from_rate, to_rate)
+                           if from_rate != to_rate else None)
+
+    def convert(self, data):
+        """Return the int16 mono bytes available after feeding data."""
+        samples = pcm_to_mono(data, self.channels, self.sample_width)
+        if self._resampler is not None:
+            samples = self._resampler.process(samples)
+        return to_pcm16(samples)
+
+    def flush(self):
+        """Return the last bytes at the end of the stream."""
+        if self._resampler is None:
+            return b""
+        return to_pcm16(self._resampler.flush())
@@ -1,35 +1,35 @@
 import streamlit as st
 import speech_recognition as sr
-import wave
-import pyaudio
 import threading
-import time
+import queue
 import os
 import json
+import uuid
 from datetime import datetime
-from vosk import Model, KaldiRecognizer
-from pydub import AudioSegment
+from recognizer_pool import get_recognizer_pool
+from audio_buffer import PCMBuffer
+from audio_devices import get_audio_host, PA_INT16
+from transcript import Transcript
 
+# pyaudio, vosk and the NumPy-based VAD are imported where they are first
+# used, so pages that never touch audio do not pay for loading them.
 
-def check_microphone():
+def check_microphone(max_age=None):
     """
     Check if a microphone is connected and accessible.
     Returns tuple of (boolean, string) indicating status and message.
+
+    Uses the shared audio host's device inventory, which is rescanned at
+    most every INVENTORY_TTL seconds. Pass max_age=0 to force a fresh scan,
+    e.g. after the user plugs in a microphone.
     """
     try:
-        p = pyaudio.PyAudio()
-        input_devices = []
-
-        # Check all audio devices
-        for i in range(p.get_device_count()):
-            device_info = p.get_device_info_by_index(i)
-            if device_info['maxInputChannels'] > 0:
-                input_devices.append(device_info['name'])
-
-        p.terminate()
+        host = get_audio_host()
+        input_devices = host.refresh() if max_age == 0 else host.input_devices(max_age)
 
         if input_devices:
-            return True, f"Found {len(input_devices)} microphone(s): {', '.join(input_devices)}"
+            names = ', '.join(device.name for device in input_devices)
+            return True, f"Found {len(input_devices)} microphone(s): {names}"
         else:
             return False, "No microphone detected. Please connect a microphone and try again."
 
@@ -38,127 +38,460 @@ def check_microphone():
 
 
 class AudioRecorder:
-    def __init__(self):
+    def __init__(self, max_duration=600, auto_stop_silence=None, input_device=None,
+                 workspace=None):
         self.CHUNK = 1024
-        self.FORMAT = pyaudio.paInt16
+        self.FORMAT = PA_INT16
         self.CHANNELS = 1
         self.RATE = 16000
-        self.frames = []
+        # Device index to record from, None for the system default
+        self.input_device = input_device
+        # Rate the device actually captures at; resampled to RATE if different
+        self.capture_rate = None
+        self.max_duration = max_duration
+        self.buffer = PCMBuffer(max_seconds=max_duration,
+                                sample_rate=self.RATE,
+                                channels=self.CHANNELS,
+                                sample_width=2)
         self.is_recording = False
+        self.max_duration_reached = False
+        # Stop automatically after this many seconds of silence following speech
+        self.auto_stop_silence = auto_stop_silence
+        self.auto_stopped = False
         self.error = None
+        # WAV written when the last recording stopped
+        self.filename = None
+        # Session workspace recordings are saved in; the current directory if None
+        self.workspace = workspace
+        self._thread = None
+        self._max_frames = None
+
+        # Live transcription state
+        self.recognizer = None
+        self.transcript = Transcript()
+        self.partial_text = ""
+        self._live_queue = None
+        self._live_thread = None
+        self._live_done = threading.Event()
+        self._live_done.set()
+
+    def start_recording(self, live_transcription=False, model_path=None):
+        """
+        Start recording audio from the microphone.
+
+        Args:
+            live_transcription (bool): Feed captured chunks to a recognizer while
+                recording so partial text is available as the user speaks.
+            model_path (str): Vosk model directory for live transcription.
+                Defaults to MODEL_PATH.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self.error = "A recording is already in progress"
+            return False
+
+        # Refuse now rather than record audio that cannot be saved, and stop
+        # the recording before it outgrows the room that is left
+        self._max_frames = None
+        if self.workspace is not None:
+            try:
+                self.workspace.ensure_room(self.RATE * self.CHANNELS * 2 + 44)
+            except Exception as e:
+                self.error = str(e)
+                return False
+            room = self.workspace.max_bytes - self.workspace.usage() - 44
+            self._max_frames = room // (self.CHANNELS * 2)
+
+        self.buffer.clear()
+        self.filename = None
+        self.max_duration_reached = False
+        self.auto_stopped = False
+        self.transcript = Transcript()
+        self.partial_text = ""
+        self.recognizer = None
+        self._live_queue = None
+
+        if live_transcription:
+            try:
+                self.recognizer = get_recognizer_pool().acquire(model_path or MODEL_PATH,
+                                                                self.RATE)
+                self._live_queue = queue.Queue()
+                self._live_done.clear()
+                self._live_thread = threading.Thread(target=self._transcribe_live, daemon=True)
+                self._live_thread.start()
+            except Exception as e:
+                # Fall back to plain recording if the model is unavailable
+                self.error = str(e)
+                if self.recognizer is not None:
+                    get_recognizer_pool().release(self.recognizer, discard=True)
+                self.recognizer = None
 
-    def start_recording(self):
-        """Start recording audio from the microphone."""
-        self.frames = []
         self.is_recording = True
-        threading.Thread(target=self._record_audio).start()
+        self._thread = threading.Thread(target=self._record_audio, name="audio-recorder")
+        self._thread.start()
         return True
 
-    def stop_recording(self):
-        """Stop the audio recording."""
+    def stop_recording(self, timeout=None):
+        """
+        Stop the audio recording and wait for the WAV file to be written.
+
+        Args:
+            timeout (float): Seconds to wait for the recording thread, or None
+                to wait until it finishes.
+
+        Returns:
+            bool: True if the recording thread has finished.
+        """
         self.is_recording = False
+        return self.join(timeout)
+
+    def join(self, timeout=None):
+        """
+        Wait for the recording thread to finish on its own, e.g. after
+        auto-stop or when the maximum duration is reached.
+
+        Returns:
+            bool: True if no recording thread is still running.
+        """
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _transcribe_live(self):
+        """
+        Consume captured chunks on a separate thread so recognition never
+        stalls the microphone read loop.
+        """
+        failed = False
+        try:
+            while True:
+                data = self._live_queue.get()
+                if data is None:
+                    break
+                if self.recognizer.AcceptWaveform(data):
+                    self.transcript.add_result(json.loads(self.recognizer.Result()))
+                    self.partial_text = ""
+                else:
+                    self.partial_text = json.loads(self.recognizer.PartialResult()).get("partial", "")
+
+            self.transcript.add_result(json.loads(self.recognizer.FinalResult()))
+            self.partial_text = ""
+        except Exception as e:
+            self.error = str(e)
+            failed = True
+        finally:
+            get_recognizer_pool().release(self.recognizer, discard=failed)
+            self._live_done.set()
+
+    def get_live_transcript(self):
+        """
+        Return the text recognized so far while recording.
+
+        Returns:
+            tuple: (final_text, partial_text) where partial_text is the
+            in-progress hypothesis for the current utterance.
+        """
+        return self.transcript.text, self.partial_text
+
+    def wait_for_transcript(self, timeout=None):
+        """
+        Wait for the live recognizer to drain after stop_recording().
+
+        Returns:
+            str: Final transcript, or None if live transcription was not
+            enabled or did not finish within timeout.
+        """
+        if self.recognizer is None or not self._live_done.wait(timeout):
+            return None
+        return self.transcript.text
 
     def _record_audio(self):
         """Internal method to handle the recording process."""
         try:
-            p = pyaudio.PyAudio()
-            stream = p.open(format=self.FORMAT,
-                            channels=self.CHANNELS,
-                            rate=self.RATE,
-                            input=True,
-                            frames_per_buffer=self.CHUNK)
-
-            while self.is_recording:
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                self.frames.append(data)
-
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
-
-            # Save the recording with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"recording_{timestamp}.wav"
+            from resampler import PCMConverter
+            from vad import StreamingVAD
+
+            host = get_audio_host()
+            device, self.capture_rate = host.resolve_input(self.input_device, self.RATE,
+                                                           self.CHANNELS)
+            # Read about the same duration per block whatever the device rate
+            frames_per_read = max(1, self.CHUNK * self.capture_rate // self.RATE)
+            converter = (PCMConverter(self.CHANNELS, 2, self.capture_rate, self.RATE)
+                         if self.capture_rate != self.RATE else None)
+
+            detector = StreamingVAD(self.RATE) if self.auto_stop_silence else None
+
+            stream = host.open_input(device.index, self.capture_rate, self.CHANNELS,
+                                     frames_per_read)
+            try:
+                while self.is_recording:
+                    data = stream.read(frames_per_read, exception_on_overflow=False)
+                    if converter is not None:
+                        data = converter.convert(data)
+                    self.buffer.write(data)
+                    if self._live_queue is not None:
+                        self._live_queue.put(data)
+                    if self.buffer.is_full or (self._max_frames is not None and
+                                               self.buffer.frame_count + self.CHUNK
+                                               > self._max_frames):
+                        # Stop a forgotten recording instead of growing without
+                        # limit, or before the next block would pass the quota
+                        self.max_duration_reached = True
+                        self.is_recording = False
+                    if detector is not None:
+                        detector.feed(data)
+                        if detector.heard_speech and detector.silence_seconds >= self.auto_stop_silence:
+                            self.auto_stopped = True
+                            self.is_recording = False
+            finally:
+                host.close_stream(stream)
+
+            if self._live_queue is not None:
+                self._live_queue.put(None)
+
+            # Save the recording under a name no other session can be using.
+            # Its size was capped to the quota when recording started.
+            if self.workspace is not None:
+                filename = self.workspace.new_path("recording", ".wav")
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"recording_{timestamp}_{uuid.uuid4().hex[:8]}.wav"
             self.save_audio(filename)
-            st.session_state.audio_file = filename
+            self.filename = filename
 
         except Exception as e:
             self.error = str(e)
             self.is_recording = False
+            if self._live_queue is not None:
+                self._live_queue.put(None)
 
     def save_audio(self, filename):
         """Save the recorded audio to a WAV file."""
         try:
-            with wave.open(filename, 'wb') as wf:
-                wf.setnchannels(self.CHANNELS)
-                wf.setsampwidth(pyaudio.PyAudio().get_sample_size(self.FORMAT))
-                wf.setframerate(self.RATE)
-                wf.writeframes(b''.join(self.frames))
+            self.buffer.write_wav(filename)
         except Exception as e:
             self.error = str(e)
 
 import os
-import wave
 import json
+import itertools
+from collections import namedtuple
 from datetime import datetime
-from vosk import Model, KaldiRecognizer
-from pydub import AudioSegment
 import streamlit as st
+from recognizer_pool import pooled_recognizer
+from audio_pipeline import iter_pcm_chunks, iter_pcm_chunks_from_stream, TARGET_RATE, CHUNK_FRAMES
+from transcript_cache import CacheEntry
+from workspace import get_workspace_manager
 from speech_recognition import AudioRecorder, check_microphone
 
 # Update the model path to your specific location
 MODEL_PATH = r"C:\Users\sufya\OneDrive\Desktop\streamlit\models\vosk-model-en-us-daanzu-20200905"
 
+# One result from stream_transcription(). kind is 'partial' for the running
+# hypothesis of the current utterance and 'final' once it is settled; words,
+# start and end are only filled in for finals.
+TranscriptionEvent = namedtuple("TranscriptionEvent", ["kind", "text", "words", "start", "end"])
+
+
+def _iter_source_chunks(source, chunk_frames):
+    """Turn a path, binary stream or iterable of PCM blocks into PCM blocks."""
+    if isinstance(source, (str, os.PathLike)):
+        return iter_pcm_chunks(os.fspath(source), chunk_frames)
+    if hasattr(source, "read"):
+        return iter_pcm_chunks_from_stream(source, chunk_frames)
+    return iter(source)
+
+
+def _final_event(result):
+    words = result.get("result", [])
+    return TranscriptionEvent("final", result.get("text", ""), words,
+                              words[0]["start"] if words else None,
+                              words[-1]["end"] if words else None)
+
 
-def convert_audio_to_text(audio_file_path, model_path=MODEL_PATH):
+def stream_transcription(source, model_path=MODEL_PATH, chunk_frames=CHUNK_FRAMES,
+                         partial_results=True, cancel_event=None):
     """
-    Convert an audio file to text using the Vosk speech recognition model.
+    Transcribe audio incrementally, yielding results as the audio is consumed.
+
+    The first partial is available after the first block (a quarter of a
+    second of audio by default), however long the input is. Stop iterating,
+    close the generator or set cancel_event to abandon the rest of the input;
+    any decoder subprocess is cleaned up either way.
+
+    Args:
+        source: Path to an audio file, a binary stream (WAV or raw 16 kHz
+            mono int16 PCM), or an iterable of raw 16 kHz mono int16 PCM
+            blocks such as a live microphone feed.
+        model_path (str): Path to the Vosk model directory.
+        chunk_frames (int): Frames fed to the recognizer per call.
+        partial_results (bool): Also yield partial hypotheses while an
+            utterance is in progress.
+        cancel_event (threading.Event): Stop early once this is set.
+
+    Yields:
+        TranscriptionEvent: Partial and final results in order. Only final
+        results with non-empty text are yielded.
+    """
+    chunks = _iter_source_chunks(source, chunk_frames)
+    last_partial = ""
+
+    try:
+        # Recognizers are reused across calls, saving setup on short clips
+        with pooled_recognizer(model_path, TARGET_RATE) as recognizer:
+            for data in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if recognizer.AcceptWaveform(data):
+                    last_partial = ""
+                    event = _final_event(json.loads(recognizer.Result()))
+                    if event.text:
+                        yield event
+                elif partial_results:
+                    partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                    # Only report when the hypothesis actually changed
+                    if partial and partial != last_partial:
+                        last_partial = partial
+                        yield TranscriptionEvent("partial", partial, None, None, None)
+
+            event = _final_event(json.loads(recognizer.FinalResult()))
+            if event.text:
+                yield event
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def _iter_speech_segments(recognizer, audio_file_path, transcript):
+    """
+    Feed only the speech portions of a file to the recognizer, adding the
+    results to transcript with word times mapped back to file time.
+
+    Yields:
+        dict: {"start", "end", "text"} for each speech segment, with times in
+        seconds from the start of the file.
+    """
+    from vad import StreamingVAD
+
+    vad = StreamingVAD(TARGET_RATE)
+    segment_words = len(transcript)
+    segment_utterances = len(transcript.utterance_texts)
+    # Recognizer time only advances for audio it is fed, so track how much
+    # was fed before the current segment to map its times back to the file
+    fed_seconds = 0.0
+    segment_fed_seconds = 0.0
+
+    for data in itertools.chain(iter_pcm_chunks(audio_file_path), [None]):
+        events = vad.flush() if data is None else vad.feed(data)
+        for kind, payload in events:
+            if kind == "audio":
+                fed_seconds += len(payload) / 2 / TARGET_RATE
+                if recognizer.AcceptWaveform(payload):
+                    transcript.add_result(json.loads(recognizer.Result()))
+            else:
+                # End of a speech segment: flush the recognizer so the next
+                # segment starts a fresh utterance
+                transcript.add_result(json.loads(recognizer.FinalResult()))
+                start, end = payload
+                shift = start - segment_fed_seconds
+                for i in range(segment_words, len(transcript)):
+                    transcript.starts[i] += shift
+                    transcript.ends[i] += shift
+                yield {"start": start, "end": end,
+                       "text": " ".join(transcript.utterance_texts[segment_utterances:])}
+                segment_words = len(transcript)
+                segment_utterances = len(transcript.utterance_texts)
+                segment_fed_seconds = fed_seconds
+
+
+def transcribe_speech_segments(audio_file_path, model_path=MODEL_PATH):
+    """
+    Transcribe only the speech in an audio file, skipping silence.
     
     Args:
         audio_file_path (str): Path to the audio file.
         model_path (str): Path to the Vosk model directory.
         
     Returns:
-        str: Transcribed text or None if transcription fails.
+        list[dict]: One {"start", "end", "text"} entry per speech segment,
+        or None if transcription fails.
     """
     try:
-        # Verify if the model path exists
-        if not os.path.exists(model_path):
-            raise ValueError(f"Model path '{model_path}' does not exist.")
-
-        # Load the Vosk model
-        model = Model(model_path)
-        recognizer = KaldiRecognizer(model, 16000)
-
-        # Convert audio to a compatible format using pydub (if necessary)
-        audio = AudioSegment.from_file(audio_file_path)
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        audio.export("temp_audio.wav", format="wav")
+        with pooled_recognizer(model_path, TARGET_RATE) as recognizer:
+            return list(_iter_speech_segments(recognizer, audio_file_path, Transcript()))
+    except Exception as e:
+        print(f"Error during transcription: {e}")
+        return None
 
-        # Read the processed WAV file
-        with wave.open("temp_audio.wav", "rb") as wav_file:
-            recognizer = KaldiRecognizer(model, wav_file.getframerate())
-            recognizer.SetWords(True)
-            transcribed_text = ""
 
-            while True:
-                data = wav_file.readframes(4000)
-                if len(data) == 0:
-                    break
-                if recognizer.AcceptWaveform(data):
-                    result = json.loads(recognizer.Result())
-                    transcribed_text += result.get("text", "")
+def transcribe_audio(audio_file_path, model_path=MODEL_PATH, use_cache=True,
+                     skip_silence=False, raise_errors=False):
+    """
+    Transcribe an audio file, keeping word timings and confidences.
+    
+    Args:
+        audio_file_path (str): Path to the audio file.
+        model_path (str): Path to the Vosk model directory.
+        use_cache (bool): Return a stored transcript if this exact audio was
+            already transcribed with this model, and store new results.
+        skip_silence (bool): Run voice-activity detection first and send only
+            speech to the recognizer.
+        raise_errors (bool): Let errors propagate instead of printing them
+            and returning None.
+        
+    Returns:
+        Transcript: The structured transcript, or None if transcription fails.
+    """
+    try:
+        entry = (CacheEntry(audio_file_path, model_path, "+vad" if skip_silence else "")
+                 if use_cache else None)
+        if entry is not None:
+            cached = entry.load()
+            if cached is not None:
+                return cached
+
+        transcript = Transcript()
+
+        if skip_silence:
+            with pooled_recognizer(model_path, TARGET_RATE) as recognizer:
+                for _ in _iter_speech_segments(recognizer, audio_file_path, transcript):
+                    pass
+        else:
+            # Decode and resample in memory, feeding the recognizer block by block
+            for event in stream_transcription(audio_file_path, model_path,
+                                              partial_results=False):
+                transcript.add_result({"text": event.text, "result": event.words})
 
-            # Get the final part of the recognition
-            final_result = json.loads(recognizer.FinalResult())
-            transcribed_text += final_result.get("text", "")
+        if entry is not None:
+            entry.store(transcript)
 
-        return transcribed_text
+        return transcript
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error during transcription: {e}")
         return None
 
+
+def convert_audio_to_text(audio_file_path, model_path=MODEL_PATH, use_cache=True,
+                          skip_silence=False):
+    """
+    Convert an audio file to text using the Vosk speech recognition model.
+    
+    Args:
+        audio_file_path (str): Path to the audio file.
+        model_path (str): Path to the Vosk model directory.
+        use_cache (bool): Reuse and store results in the transcript cache.
+        skip_silence (bool): Send only detected speech to the recognizer.
+        
+    Returns:
+        str: Transcribed text or None if transcription fails.
+    """
+    transcript = transcribe_audio(audio_file_path, model_path, use_cache, skip_silence)
+    return transcript.text if transcript is not None else None
+
 def speech_to_text():
     st.title("Speech to Text Converter")
 
@@ -170,8 +503,10 @@ def speech_to_text():
         st.success(mic_message)
 
     # Initialize session state variables
+    if 'workspace' not in st.session_state:
+        st.session_state.workspace = get_workspace_manager().create()
     if 'audio_recorder' not in st.session_state:
-        st.session_state.audio_recorder = AudioRecorder()
+        st.session_state.audio_recorder = AudioRecorder(workspace=st.session_state.workspace)
     if 'recording' not in st.session_state:
         st.session_state.recording = False
     if 'audio_file' not in st.session_state:
@@ -191,19 +526,21 @@ def speech_to_text():
                         st.error(f"Failed to start recording: {st.session_state.audio_recorder.error}")
             else:
                 if st.form_submit_button("⏹️ Stop Recording"):
-                    st.session_state.audio_recorder.stop_recording()
+                    st.session_state.audio_recorder.stop_recording(timeout=5)
                     st.session_state.recording = False
-                    # Save recording to a file
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    st.session_state.audio_file = f"recording_{timestamp}.wav"
+                    st.session_state.audio_file = st.session_state.audio_recorder.filename
 
         with col2:
             if st.session_state.audio_file and os.path.exists(st.session_state.audio_file):
                 if st.form_submit_button("📝 Transcribe Audio"):
                     with st.spinner("Transcribing..."):
-                        transcribed_text = convert_audio_to_text(
-                            st.session_state.audio_file, model_path=MODEL_PATH
-                        )
+                        st.session_state.workspace.lease(st.session_state.audio_file)
+                        try:
+                            transcribed_text = convert_audio_to_text(
+                                st.session_state.audio_file, model_path=MODEL_PATH
+                            )
+                        finally:
+                            st.session_state.workspace.release(st.session_state.audio_file)
                         if transcribed_text:
                             st.session_state.transcribed_text = transcribed_text
                             st.success("Transcription complete!")
@@ -213,13 +550,11 @@ def speech_to_text():
         if st.form_submit_button("🗑️ Clear"):
             st.session_state.transcribed_text = ""
             st.session_state.audio_file = None
-            # Clean up audio files
-            for file in os.listdir():
-                if file.startswith("recording_") and file.endswith(".wav"):
-                    try:
-                        os.remove(file)
-                    except Exception as e:
-                        st.error(f"Error deleting file {file}: {e}")
+            # Only this session's recordings are deleted
+            try:
+                st.session_state.workspace.clear()
+            except Exception as e:
+                st.error(f"Error deleting audio files: {e}")
 
     # Display the transcribed text in a text area
     st.text_area("Transcribed Text", st.session_state.transcribed_text, height=200, key="transcript_area")
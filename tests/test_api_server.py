@@ -0,0 +1,152 @@
+import http.client
+import json
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import pytest
+
+import api_server
+from transcript import Transcript
+from transcription_service import QueueFullError, TranscriptionJob
+
+
+class FakeService:
+    """Stands in for TranscriptionService; the test finishes jobs by hand."""
+
+    max_pending = 1
+
+    def __init__(self):
+        self.jobs = {}
+        self.full = False
+
+    def has_capacity(self):
+        return not self.full
+
+    @contextmanager
+    def reserve(self, timeout=0):
+        if self.full:
+            raise QueueFullError("Transcription queue is full")
+        yield
+
+    def submit_segmented(self, path):
+        job = TranscriptionJob(uuid.uuid4().hex, path, Future())
+        self.jobs[job.id] = job
+        return job
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def stats(self):
+        return {"max_pending": self.max_pending}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    service = FakeService()
+    monkeypatch.setattr(api_server, "get_transcription_service", lambda model_path: service)
+    api = api_server.TranscriptionAPI(model_path="model", upload_dir=str(tmp_path), token="secret")
+    server = api_server.TranscriptionServer(("127.0.0.1", 0), api)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, service
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+
+
+def _finish(job, text):
+    transcript = Transcript()
+    transcript.add_result({"text": text, "result": [
+        {"word": word, "start": float(i), "end": i + 0.5, "conf": 1.0}
+        for i, word in enumerate(text.split())]})
+    job._future.set_running_or_notify_cancel()
+    job._future.set_result(transcript)
+
+
+def test_submit_and_poll(server):
+    server, service = server
+    status, body = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    assert status == 202
+    assert body["status"] == "queued"
+
+    status, body = _request(server, "GET", f"/transcriptions/{body['id']}")
+    assert (status, body["status"]) == (200, "queued")
+
+    job = service.get_job(body["id"])
+    _finish(job, "hello world")
+    status, body = _request(server, "GET", f"/transcriptions/{job.id}?wait=1")
+    assert status == 200
+    assert body["status"] == "done"
+    assert body["text"] == "hello world"
+
+
+def test_failed_job_is_a_server_error(server):
+    server, service = server
+    _, body = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    job = service.get_job(body["id"])
+    job._future.set_running_or_notify_cancel()
+    job._future.set_exception(RuntimeError("Failed to process waveform"))
+    status, body = _request(server, "GET", f"/transcriptions/{job.id}")
+    assert (status, body["status"]) == (500, "failed")
+    assert body["error"] == "Failed to process waveform"
+
+
+def test_silence_is_not_a_failure(server):
+    server, service = server
+    _, body = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    job = service.get_job(body["id"])
+    _finish(job, "")
+    status, body = _request(server, "GET", f"/transcriptions/{job.id}")
+    assert (status, body["status"], body["text"]) == (200, "done", "")
+    assert body["message"] == "No speech recognized"
+
+
+def test_cancel(server):
+    server, service = server
+    _, body = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    status, body = _request(server, "DELETE", f"/transcriptions/{body['id']}")
+    assert (status, body["status"]) == (200, "cancelled")
+
+    # Too late once recognition has started
+    _, body = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    service.get_job(body["id"])._future.set_running_or_notify_cancel()
+    status, body = _request(server, "DELETE", f"/transcriptions/{body['id']}")
+    assert (status, body["error"]) == (409, "Job is running")
+
+
+def test_full_queue_rejected_before_upload(server, tmp_path):
+    server, service = server
+    service.full = True
+    status, _ = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    assert status == 503
+    status, _ = _request(server, "POST", "/transcriptions?stream=1", b"RIFF audio")
+    assert status == 503
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_bad_wait_is_a_client_error(server):
+    server, _ = server
+    _, body = _request(server, "POST", "/transcriptions", b"RIFF audio")
+    status, _ = _request(server, "GET", f"/transcriptions/{body['id']}?wait=soon")
+    assert status == 400
+
+
+def test_user_id_requires_token(server):
+    server, service = server
+    status, _ = _request(server, "POST", "/transcriptions?user_id=1", b"RIFF audio")
+    assert status == 403
+    status, _ = _request(server, "POST", "/transcriptions?user_id=1", b"RIFF audio",
+                         {"Authorization": "Bearer wrong"})
+    assert status == 403
+    assert service.jobs == {}
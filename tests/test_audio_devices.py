@@ -0,0 +1,115 @@
+import pytest
+
+from audio_devices import AudioHost, PA_INT16
+
+
+class FakeStream:
+    def __init__(self):
+        self.closed = False
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBackend:
+    """PyAudio stand-in with a fixed device list."""
+
+    def __init__(self, devices, default_index=None, supported_rates=(16000,)):
+        self.devices = devices
+        self.default_index = default_index
+        self.supported_rates = supported_rates
+        self.terminated = False
+
+    def get_default_input_device_info(self):
+        if self.default_index is None:
+            raise IOError("No default input device available")
+        return {"index": self.default_index}
+
+    def get_device_count(self):
+        return len(self.devices)
+
+    def get_device_info_by_index(self, index):
+        return self.devices[index]
+
+    def is_format_supported(self, rate, input_device, input_channels, input_format):
+        assert input_format == PA_INT16
+        if rate not in self.supported_rates:
+            raise ValueError("Invalid sample rate")
+        return True
+
+    def open(self, **kwargs):
+        return FakeStream()
+
+    def terminate(self):
+        self.terminated = True
+
+
+def _device(name, inputs, rate=44100.0):
+    return {"name": name, "maxInputChannels": inputs, "defaultSampleRate": rate}
+
+
+DEVICES = [_device("Speakers", 0), _device("USB mic", 1, 48000.0), _device("Built-in", 2)]
+
+
+def _host(*args, **kwargs):
+    backends = []
+
+    def factory():
+        backends.append(FakeBackend(*args, **kwargs))
+        return backends[-1]
+
+    return AudioHost(backend_factory=factory), backends
+
+
+def test_lists_only_input_devices():
+    host, _ = _host(DEVICES, default_index=2)
+    devices = host.input_devices()
+    assert [(d.index, d.name, d.is_default) for d in devices] == [
+        (1, "USB mic", False), (2, "Built-in", True)]
+    assert devices[0].default_sample_rate == 48000
+
+
+def test_inventory_is_cached_until_refresh():
+    host, backends = _host(DEVICES, default_index=2)
+    host.input_devices()
+    host.input_devices()
+    assert host.scans == 1
+
+    host.refresh()
+    assert host.scans == 2
+    # Restarted so newly plugged-in devices show up
+    assert backends[0].terminated and len(backends) == 2
+
+
+def test_refresh_keeps_backend_with_open_stream():
+    host, backends = _host(DEVICES, default_index=2)
+    stream = host.open_input(2, 16000)
+    host.refresh()
+    assert len(backends) == 1 and not backends[0].terminated
+    host.close_stream(stream)
+    assert stream.closed
+
+
+def test_default_falls_back_to_first_input_device():
+    host, _ = _host(DEVICES, default_index=None)
+    assert host.default_input_device().name == "USB mic"
+
+
+def test_resolve_falls_back_to_device_rate():
+    host, _ = _host(DEVICES, default_index=1, supported_rates=(44100,))
+    device, rate = host.resolve_input()
+    assert (device.name, rate) == ("USB mic", 48000)
+
+    host, _ = _host(DEVICES, default_index=1, supported_rates=(16000,))
+    assert host.resolve_input(2)[1] == 16000
+
+
+def test_resolve_without_devices():
+    host, _ = _host([_device("Speakers", 0)])
+    with pytest.raises(ValueError, match="No microphone detected"):
+        host.resolve_input()
+    with pytest.raises(ValueError, match="No input device 0"):
+        host.resolve_input(0)
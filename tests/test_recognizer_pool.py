@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from recognizer_pool import RecognizerPool
+
+
+class FakeRecognizer:
+    def FinalResult(self):
+        return '{"text": ""}'
+
+
+def _pool(**kwargs):
+    return RecognizerPool(recognizer_factory=lambda key: FakeRecognizer(), **kwargs)
+
+
+def test_released_recognizer_is_reused():
+    pool = _pool()
+    first = pool.acquire("model")
+    pool.release(first)
+    assert pool.acquire("model") is first
+    assert (pool.created, pool.reused) == (1, 1)
+
+
+def test_checkouts_are_capped_per_key():
+    pool = _pool(max_in_use_per_key=2)
+    held = [pool.acquire("model"), pool.acquire("model")]
+    with pytest.raises(TimeoutError):
+        pool.acquire("model", timeout=0.05)
+    assert pool.stats()["waited"] == 1
+    # Other keys have their own limit
+    pool.release(pool.acquire("model", sample_rate=8000))
+
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire("model", timeout=5)))
+    waiter.start()
+    pool.release(held.pop())
+    waiter.join(5)
+    assert acquired and pool.stats()["in_use"] == 2
+
+
+def test_failed_creation_frees_the_slot():
+    def factory(key):
+        raise RuntimeError("no model")
+
+    pool = RecognizerPool(max_in_use_per_key=1, recognizer_factory=factory)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            pool.acquire("model", timeout=0.05)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from resampler import PCMConverter, PolyphaseResampler, to_pcm16
+
+TARGET_RATE = 16000
+
+
+def _speech_like(rate, seconds=2.0, seed=0):
+    """Band-limited noise plus tones below 8 kHz, on the int16 scale."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * seconds)) / rate
+    signal = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, 2 * np.pi))
+                 for f in (220, 1250, 3100, 6000))
+    return (4000 * signal).astype(np.float32)
+
+
+def _fft_reference(samples, rate):
+    """Ideal band-limited resampling to 16 kHz, by truncating the spectrum."""
+    output_length = -(-len(samples) * TARGET_RATE // rate)
+    step = rate // np.gcd(rate, TARGET_RATE)
+    padded = np.zeros(-(-len(samples) // step) * step)
+    padded[:len(samples)] = samples
+    padded_length = len(padded) * TARGET_RATE // rate
+    spectrum = np.fft.rfft(padded)[:padded_length // 2 + 1]
+    return (np.fft.irfft(spectrum, padded_length) * padded_length / len(padded))[:output_length]
+
+
+def _resample(samples, rate, block):
+    resampler = PolyphaseResampler(rate, TARGET_RATE)
+    parts = [resampler.process(samples[i:i + block]) for i in range(0, len(samples), block)]
+    return np.concatenate(parts + [resampler.flush()])
+
+
+def _signal_to_error_db(output, expected):
+    # Ignore 50 ms at each end, where the FFT reference wraps around
+    edge = TARGET_RATE // 20
+    output, expected = output[edge:-edge], expected[edge:-edge]
+    return 10 * np.log10(np.mean(expected ** 2) / np.mean((output - expected) ** 2))
+
+
+@pytest.mark.parametrize("rate", [8000, 22050, 44100, 48000])
+def test_matches_fft_reference(rate):
+    samples = _speech_like(rate)
+    output = _resample(samples, rate, len(samples))
+    expected = _fft_reference(samples, rate)
+    assert len(output) == len(expected)
+    assert _signal_to_error_db(output, expected) > 50
+
+
+@pytest.mark.parametrize("rate", [22050, 44100, 48000])
+def test_output_independent_of_block_size(rate):
+    samples = _speech_like(rate, seconds=1.0)
+    whole = _resample(samples, rate, len(samples))
+    for block in (1, 997, 4000):
+        assert np.array_equal(_resample(samples, rate, block), whole)
+
+
+def test_removes_content_above_new_nyquist():
+    rate = 48000
+    t = np.arange(rate) / rate
+    tone = (8000 * np.sin(2 * np.pi * 12000 * t)).astype(np.float32)
+    output = _resample(tone, rate, 4000)
+    assert np.sqrt(np.mean(output[800:-800] ** 2)) < 8000 * 0.01
+
+
+def test_pcm_converter_downmixes_stereo():
+    samples = _speech_like(44100, seconds=0.5)
+    stereo = np.stack([samples, samples], axis=1)
+    converter = PCMConverter(2, 2, 44100, TARGET_RATE)
+    output = converter.convert(to_pcm16(stereo)) + converter.flush()
+    mono = PCMConverter(1, 2, 44100, TARGET_RATE)
+    assert output == mono.convert(to_pcm16(samples)) + mono.flush()
@@ -0,0 +1,27 @@
+import os
+import threading
+
+import pytest
+
+from model_registry import default_registry
+from transcription_service import TranscriptionService
+
+
+def test_job_runs_while_a_model_load_is_in_progress(tmp_path):
+    model_path = str(tmp_path / "model")
+    key = os.path.abspath(model_path)
+    # What a slow background preload looks like: its load lock is held
+    with default_registry._lock:
+        load_lock = default_registry._load_locks.setdefault(key, threading.Lock())
+    load_lock.acquire()
+    service = TranscriptionService(model_path=model_path, max_workers=1)
+    try:
+        job = service.submit(str(tmp_path / "missing.wav"))
+        # There is no audio, so the job fails, but it must finish rather
+        # than wait on a lock copied into the worker
+        with pytest.raises(FileNotFoundError):
+            job.transcript(timeout=60)
+        assert job.status() == "failed"
+    finally:
+        load_lock.release()
+        service.shutdown(wait=False)
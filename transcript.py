@@ -0,0 +1,146 @@
+import json
+from array import array
+
+
+def _format_timestamp(seconds, separator):
+    millis = int(round(max(seconds, 0.0) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+class Transcript:
+    """
+    Recognized text with per-word timing and confidence.
+
+    Word times and confidences live in parallel typed arrays instead of one
+    dict per word, and utterances are recorded as boundaries into those arrays,
+    so building a transcript is linear in the number of words. Vosk result
+    dicts are added as they come out of the recognizer.
+    """
+
+    def __init__(self):
+        self.words = []
+        self.starts = array('d')
+        self.ends = array('d')
+        self.confidences = array('f')
+        # Utterance i covers words[utterance_ends[i-1]:utterance_ends[i]]
+        self.utterance_ends = array('l')
+        self.utterance_texts = []
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def text(self):
+        """Full transcript, utterances separated by single spaces."""
+        return " ".join(t for t in self.utterance_texts if t)
+
+    def add_result(self, result, offset=0.0):
+        """
+        Append one recognizer result.
+
+        Args:
+            result (dict): Parsed Result()/FinalResult() JSON from Vosk.
+            offset (float): Seconds added to every word time, e.g. the start
+                of the segment this result came from.
+        """
+        text = result.get("text", "")
+        if not text:
+            return
+        for word in result.get("result", []):
+            self.words.append(word["word"])
+            self.starts.append(word["start"] + offset)
+            self.ends.append(word["end"] + offset)
+            self.confidences.append(word.get("conf", 1.0))
+        self.utterance_ends.append(len(self.words))
+        self.utterance_texts.append(text)
+
+    def extend(self, other):
+        """Append every utterance of another transcript (already in file time)."""
+        base = len(self.words)
+        self.words.extend(other.words)
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+        self.confidences.extend(other.confidences)
+        self.utterance_ends.extend(base + end for end in other.utterance_ends)
+        self.utterance_texts.extend(other.utterance_texts)
+
+    @classmethod
+    def concatenate(cls, transcripts):
+        combined = cls()
+        for transcript in transcripts:
+            combined.extend(transcript)
+        return combined
+
+    def utterances(self):
+        """
+        Yield (start, end, text, first_word, last_word) per utterance.
+        Times are None for utterances recognized without word timings.
+        """
+        begin = 0
+        for end, text in zip(self.utterance_ends, self.utterance_texts):
+            if end > begin:
+                yield self.starts[begin], self.ends[end - 1], text, begin, end
+            else:
+                yield None, None, text, begin, end
+            begin = end
+
+    def to_dict(self):
+        return {
+            "text": self.text,
+            "words": self.words,
+            "starts": self.starts.tolist(),
+            "ends": self.ends.tolist(),
+            "confidences": [round(c, 4) for c in self.confidences],
+            "utterance_ends": self.utterance_ends.tolist(),
+            "utterance_texts": self.utterance_texts,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, data):
+        transcript = cls()
+        transcript.words = list(data["words"])
+        transcript.starts = array('d', data["starts"])
+        transcript.ends = array('d', data["ends"])
+        transcript.confidences = array('f', data["confidences"])
+        transcript.utterance_ends = array('l', data["utterance_ends"])
+        transcript.utterance_texts = list(data["utterance_texts"])
+        return transcript
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def _cues(self, max_words=12, max_seconds=6.0):
+        """Split utterances into caption-sized (start, end, text) cues."""
+        for start, end, text, first, last in self.utterances():
+            if start is None:
+                continue
+            cue_first = first
+            for i in range(first, last):
+                too_long = self.ends[i] - self.starts[cue_first] > max_seconds
+                if i > cue_first and (i - cue_first >= max_words or too_long):
+                    yield self.starts[cue_first], self.ends[i - 1], " ".join(self.words[cue_first:i])
+                    cue_first = i
+            yield self.starts[cue_first], self.ends[last - 1], " ".join(self.words[cue_first:last])
+
+    def to_srt(self, max_words=12, max_seconds=6.0):
+        """Render SubRip captions."""
+        blocks = []
+        for index, (start, end, text) in enumerate(self._cues(max_words, max_seconds), 1):
+            blocks.append(f"{index}\n{_format_timestamp(start, ',')} --> "
+                          f"{_format_timestamp(end, ',')}\n{text}\n")
+        return "\n".join(blocks)
+
+    def to_vtt(self, max_words=12, max_seconds=6.0):
+        """Render WebVTT captions."""
+        blocks = ["WEBVTT\n"]
+        for start, end, text in self._cues(max_words, max_seconds):
+            blocks.append(f"{_format_timestamp(start, '.')} --> "
+                          f"{_format_timestamp(end, '.')}\n{text}\n")
+        return "\n".join(blocks)
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import threading
+import time
+
+from database import ConnectionPool
+from transcript import Transcript
+
+CACHE_DB_PATH = 'transcript_cache.db'
+
+# Bump when decoding or recognition changes in a way that alters transcripts,
+# so results produced by older code are no longer served.
+PIPELINE_VERSION = 3
+
+CACHE_MIGRATIONS = [
+    [
+        '''CREATE TABLE IF NOT EXISTS transcripts (
+            cache_key TEXT PRIMARY KEY,
+            audio_hash TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            transcript TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_transcripts_last_access ON transcripts (last_access)',
+    ],
+]
+
+_SQL_GET = 'SELECT transcript FROM transcripts WHERE cache_key = ?'
+_SQL_TOUCH = 'UPDATE transcripts SET last_access = ? WHERE cache_key = ?'
+_SQL_PUT = '''
+    INSERT OR REPLACE INTO transcripts
+        (cache_key, audio_hash, model_id, transcript, size_bytes, created_at, last_access)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_TOTAL_SIZE = 'SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM transcripts'
+_SQL_OLDEST = 'SELECT cache_key, size_bytes FROM transcripts ORDER BY last_access LIMIT ?'
+_SQL_DELETE = 'DELETE FROM transcripts WHERE cache_key = ?'
+
+
+def hash_audio_file(audio_file_path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(audio_file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Parts of a Vosk model directory that decide what it recognizes
+MODEL_KEY_DIRS = ("am", "conf", "graph", "ivector", "rescore", "rnnlm")
+
+
+def model_identity(model_path):
+    """
+    Identify a model by directory name and a digest of the name, size and
+    modification time of every file under its key subdirectories (acoustic
+    model, graph, configuration, ...), so replacing any of them invalidates
+    transcripts produced by the old model. Copying files into place can
+    leave the directory's own mtime unchanged, so that alone is not enough.
+    """
+    path = os.path.abspath(model_path)
+    digest = hashlib.sha256()
+    for subdir in MODEL_KEY_DIRS:
+        for directory, dirnames, filenames in os.walk(os.path.join(path, subdir)):
+            dirnames.sort()
+            for name in sorted(filenames):
+                file_path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                digest.update(f"{os.path.relpath(file_path, path)}\0{stat.st_size}\0"
+                              f"{stat.st_mtime_ns}\n".encode("utf-8"))
+    return (f"{os.path.basename(os.path.normpath(path))}@{digest.hexdigest()[:16]}"
+            f"/v{PIPELINE_VERSION}")
+
+
+class TranscriptCache:
+    """
+    Persistent transcript cache keyed on audio content hash and model identity.
+    Values are Transcript JSON, so cached results keep their word timings.
+
+    Entries live in a small SQLite database shared by every process. When the
+    stored transcripts exceed max_bytes, the least recently used entries are
+    evicted.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._pool = ConnectionPool(db_path, max_size=4, migrations=CACHE_MIGRATIONS)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(audio_hash, model_id):
+        return f"{audio_hash}:{model_id}"
+
+    def get(self, audio_hash, model_id):
+        """
+        Look up a cached transcript.
+
+        Returns:
+            str: The cached transcript, or None on a miss.
+        """
+        key = self.make_key(audio_hash, model_id)
+        with self._pool.connection() as conn:
+            row = conn.execute(_SQL_GET, (key,)).fetchone()
+            if row is not None:
+                conn.execute(_SQL_TOUCH, (time.time(), key))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, audio_hash, model_id, transcript):
+        """Store a transcript and evict old entries if over the size limit."""
+        now = time.time()
+        size = len(transcript.encode('utf-8'))
+        with self._pool.transaction() as conn:
+            conn.execute(_SQL_PUT, (self.make_key(audio_hash, model_id), audio_hash, model_id,
+                                    transcript, size, now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total, _ = conn.execute(_SQL_TOTAL_SIZE).fetchone()
+        while total > self.max_bytes:
+            victims = conn.execute(_SQL_OLDEST, (64,)).fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                if total <= self.max_bytes:
+                    break
+                conn.execute(_SQL_DELETE, (key,))
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size."""
+        with self._pool.connection() as conn:
+            total, entries = conn.execute(_SQL_TOTAL_SIZE).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": total,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache():
+    """Return the process-wide transcript cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptCache()
+        return _cache
+
+
+class CacheEntry:
+    """
+    The cache slot for one audio file transcribed with one model, shared by
+    every transcription path so they look up and store results the same way.
+
+    Creating an entry hashes the file, so do it off any event loop.
+    """
+
+    def __init__(self, audio_file_path, model_path, variant="", cache=None):
+        """
+        Args:
+            audio_file_path (str): Path to the audio file.
+            model_path (str): Path to the Vosk model directory.
+            variant (str): Suffix for results produced differently from a
+                plain transcription of the file, e.g. "+vad".
+            cache (TranscriptCache): Defaults to get_transcript_cache().
+        """
+        self.cache = cache or get_transcript_cache()
+        self.audio_hash = hash_audio_file(audio_file_path)
+        self.model_id = model_identity(model_path) + variant
+
+    def load(self):
+        """
+        Returns:
+            Transcript: The stored transcript, or None on a miss.
+        """
+        cached = self.cache.get(self.audio_hash, self.model_id)
+        return Transcript.from_json(cached) if cached is not None else None
+
+    def store(self, transcript):
+        """Store a transcript unless it is empty."""
+        if transcript.text:
+            self.cache.put(self.audio_hash, self.model_id, transcript.to_json())
@@ -0,0 +1,382 @@
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from audio_pipeline import iter_pcm_chunks, TARGET_RATE
+from model_registry import preload_models
+from recognizer_pool import pooled_recognizer
+from speech_recognition import transcribe_audio, MODEL_PATH
+from transcript import Transcript
+from transcript_cache import CacheEntry
+
+
+class QueueFullError(Exception):
+    """Raised when the transcription queue is full and a job is rejected."""
+
+
+def _worker_init(model_path):
+    """Load the model once when a worker process starts."""
+    preload_models(model_path)
+
+
+def _transcribe_job(audio_file_path, model_path, skip_silence):
+    """
+    Run inside a worker process, reusing that worker's warm model. Errors
+    propagate so the job reports what went wrong.
+    """
+    return transcribe_audio(audio_file_path, model_path=model_path,
+                            skip_silence=skip_silence, raise_errors=True)
+
+
+def _transcribe_segment(pcm, offset_seconds, model_path):
+    """
+    Recognize one segment of 16 kHz mono PCM inside a worker process.
+
+    Returns:
+        Transcript: Word times are shifted by offset_seconds so they are
+        relative to the start of the whole file.
+    """
+    transcript = Transcript()
+    with pooled_recognizer(model_path, TARGET_RATE) as recognizer:
+        view = memoryview(pcm)
+        step = 4000 * 2
+        for offset in range(0, len(view), step):
+            if recognizer.AcceptWaveform(bytes(view[offset:offset + step])):
+                transcript.add_result(json.loads(recognizer.Result()), offset_seconds)
+        transcript.add_result(json.loads(recognizer.FinalResult()), offset_seconds)
+    return transcript
+
+
+def iter_segments(chunks, sample_rate=TARGET_RATE, target_seconds=30, max_seconds=60):
+    """
+    Cut a stream of 16 kHz mono PCM blocks into segments of at least
+    target_seconds, cutting only in pauses so no word is split between two
+    workers.
+
+    Every sample ends up in exactly one segment: the voice-activity detector
+    only chooses where to cut, so audio it takes for silence is still
+    recognized. Audio with no pause for max_seconds (or no detected speech
+    at all) is cut hard at max_seconds. At most about max_seconds of audio
+    is held in memory.
+
+    Yields:
+        tuple: (start_sample, pcm_bytes) in order.
+    """
+    from vad import StreamingVAD
+
+    target = int(target_seconds * sample_rate)
+    limit = int(max_seconds * sample_rate)
+    vad = StreamingVAD(sample_rate)
+    buffer = bytearray()
+    start = 0
+
+    for data in chunks:
+        buffer += data
+        for kind, payload in vad.feed(data):
+            if kind != "end":
+                continue
+            # Cut at the end of this stretch of speech, in the pause after it
+            cut = int(payload[1] * sample_rate) - start
+            if cut >= target:
+                yield start, bytes(buffer[:cut * 2])
+                del buffer[:cut * 2]
+                start += cut
+        while len(buffer) >= limit * 2:
+            yield start, bytes(buffer[:limit * 2])
+            del buffer[:limit * 2]
+            start += limit
+    if buffer:
+        yield start, bytes(buffer)
+
+
+class TranscriptionJob:
+    """Handle for a submitted transcription that the dashboard can poll."""
+
+    def __init__(self, job_id, audio_file_path, future):
+        self.id = job_id
+        self.audio_file_path = audio_file_path
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._future = future
+
+    def status(self):
+        """Return one of 'queued', 'running', 'done', 'failed' or 'cancelled'."""
+        if self._future.cancelled():
+            return "cancelled"
+        if self._future.done():
+            if self._future.exception() is not None or self._future.result() is None:
+                return "failed"
+            return "done"
+        if self._future.running():
+            return "running"
+        return "queued"
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """
+        Wait for and return the transcribed text.
+
+        Returns:
+            str: Transcribed text or None if transcription failed.
+        """
+        transcript = self._future.result(timeout=timeout)
+        return transcript.text if transcript is not None else None
+
+    def transcript(self, timeout=None):
+        """
+        Wait for and return the structured result with word timings.
+
+        Returns:
+            Transcript: The transcript or None if transcription failed.
+        """
+        return self._future.result(timeout=timeout)
+
+    def error(self):
+        """Return the exception raised by the worker, if any."""
+        if self._future.done() and not self._future.cancelled():
+            return self._future.exception()
+        return None
+
+    def cancel(self):
+        """Cancel the job if it has not started yet."""
+        return self._future.cancel()
+
+    def add_done_callback(self, fn):
+        """Call fn(job) once the job finishes, fails or is cancelled."""
+        self._future.add_done_callback(lambda _: fn(self))
+
+
+class TranscriptionService:
+    """
+    Bounded pool of worker processes, each holding a warm Vosk model.
+
+    At most max_pending jobs may be queued or running at once. When the queue
+    is full, submit() waits up to its timeout for a slot and then rejects the
+    job with QueueFullError, so memory stays capped under load spikes.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, max_workers=None, max_pending=None,
+                 max_finished_jobs=256):
+        self.model_path = model_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.max_finished_jobs = max_finished_jobs
+
+        # Spawned, not forked: a fork taken while another thread holds a
+        # model load lock (e.g. the dashboard's background preload) would
+        # leave the worker with that lock held forever
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_worker_init,
+                                             initargs=(model_path,))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        # Coordinates segmented jobs; the heavy work still runs in the process pool
+        self._coordinators = ThreadPoolExecutor(max_workers=max(2, self.max_workers // 2),
+                                                thread_name_prefix="segmented-transcription")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _acquire_slot(self, timeout):
+        blocking = timeout is None or timeout > 0
+        if not self._slots.acquire(blocking=blocking, timeout=timeout if timeout else None):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(
+                f"Transcription queue is full ({self.max_pending} jobs pending)"
+            )
+
+    def has_capacity(self):
+        """
+        Whether a job submitted now would get a slot. Another caller may
+        still take it first, so submit() can raise QueueFullError anyway.
+        """
+        if not self._slots.acquire(blocking=False):
+            return False
+        self._slots.release()
+        return True
+
+    @contextmanager
+    def reserve(self, timeout=0):
+        """
+        Hold a slot for work done outside the worker pool, such as
+        recognition streamed in the caller's thread, so it counts against
+        max_pending like a queued job.
+
+        Raises:
+            QueueFullError: As for submit().
+        """
+        self._acquire_slot(timeout)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def submit(self, audio_file_path, timeout=0, skip_silence=False):
+        """
+        Queue an audio file for transcription.
+
+        Args:
+            audio_file_path (str): Path to the audio file.
+            timeout (float): Seconds to wait for a free slot when the queue is
+                full. 0 rejects immediately, None waits indefinitely.
+            skip_silence (bool): Send only detected speech to the recognizer.
+
+        Returns:
+            TranscriptionJob: Handle that can be polled for the result.
+
+        Raises:
+            QueueFullError: If no slot became available within timeout.
+        """
+        self._acquire_slot(timeout)
+
+        try:
+            future = self._executor.submit(_transcribe_job, audio_file_path, self.model_path,
+                                           skip_silence)
+        except Exception:
+            self._slots.release()
+            raise
+
+        job = TranscriptionJob(uuid.uuid4().hex, audio_file_path, future)
+        future.add_done_callback(lambda _: self._on_done(job))
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def submit_segmented(self, audio_file_path, timeout=0, target_seconds=30):
+        """
+        Queue a long file for parallel transcription.
+
+        The file is decoded once and cut into segments at pauses as it is
+        decoded, and the segments are recognized in parallel across the
+        worker pool. All of the audio is recognized, pauses included. Results
+        are stitched back in order into one Transcript in file time.
+
+        Args:
+            audio_file_path (str): Path to the audio file.
+            timeout (float): As for submit().
+            target_seconds (float): Preferred segment length.
+
+        Returns:
+            TranscriptionJob: Handle that can be polled for the result.
+
+        Raises:
+            QueueFullError: If the pool has no free slot for the first segment.
+        """
+        self._acquire_slot(timeout)
+
+        try:
+            future = self._coordinators.submit(self._run_segmented, audio_file_path,
+                                               target_seconds)
+        except Exception:
+            self._slots.release()
+            raise
+
+        job = TranscriptionJob(uuid.uuid4().hex, audio_file_path, future)
+        future.add_done_callback(lambda _: self._on_segmented_done(job))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def _run_segmented(self, audio_file_path, target_seconds):
+        """
+        Coordinator for submit_segmented(). Holds one slot on entry, which
+        passes to the first segment; _on_segmented_done() returns it instead
+        if the coordinator is cancelled before it starts.
+        """
+        have_slot = True
+        futures = []
+        try:
+            entry = CacheEntry(audio_file_path, self.model_path, "+segmented")
+            cached = entry.load()
+            if cached is not None:
+                return cached
+
+            # Decoded and cut while streaming, so only the segment being
+            # collected is held in memory
+            for start, pcm in iter_segments(iter_pcm_chunks(audio_file_path), TARGET_RATE,
+                                            target_seconds):
+                # Every segment after the first waits for a free slot, so a
+                # long file cannot flood the pool ahead of other users
+                if not have_slot:
+                    self._slots.acquire()
+                    have_slot = True
+                future = self._executor.submit(_transcribe_segment, pcm, start / TARGET_RATE,
+                                               self.model_path)
+                # The slot now belongs to the segment and is freed when it finishes
+                have_slot = False
+                future.add_done_callback(lambda _: self._slots.release())
+                futures.append(future)
+
+            parts = [future.result() for future in futures]
+        finally:
+            if have_slot:
+                self._slots.release()
+
+        transcript = Transcript.concatenate(parts)
+        entry.store(transcript)
+        return transcript
+
+    def _on_segmented_done(self, job):
+        job.finished_at = time.time()
+        if job._future.cancelled():
+            # Cancelled before _run_segmented() started, so it never took
+            # over the slot submit_segmented() acquired
+            self._slots.release()
+
+    def _on_done(self, job):
+        job.finished_at = time.time()
+        self._slots.release()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished_jobs."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id):
+        """Return the job with the given id, or None if it is unknown."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Return queue depth and counters for monitoring."""
+        with self._lock:
+            statuses = [job.status() for job in self._jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait=True):
+        self._coordinators.shutdown(wait=wait, cancel_futures=True)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_transcription_service(model_path=MODEL_PATH):
+    """Return the process-wide transcription service, starting it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TranscriptionService(model_path=model_path)
+            atexit.register(_service.shutdown, wait=False)
+        return _service
@@ -0,0 +1,216 @@
+from collections import deque
+
+import numpy as np
+
+FRAME_MS = 30
+
+# Speech must be this far above the estimated noise floor...
+MARGIN_DB = 12.0
+# ...and never quieter than this, so digital silence is not called speech
+MIN_THRESHOLD_DB = -50.0
+# Frames below this are treated as digital silence and ignored by the floor tracker
+DIGITAL_SILENCE_DB = -80.0
+
+
+def frame_energies_db(samples, frame_len):
+    """
+    RMS energy of consecutive frames in dBFS.
+
+    Args:
+        samples (np.ndarray): int16 mono samples.
+        frame_len (int): Samples per frame. A trailing partial frame is ignored.
+
+    Returns:
+        np.ndarray: One float per whole frame.
+    """
+    count = len(samples) // frame_len
+    if count == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:count * frame_len].reshape(count, frame_len).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1)) / 32768.0
+    return 20.0 * np.log10(rms + 1e-10)
+
+
+def _runs(mask):
+    """Return (starts, ends) of runs of True in a boolean array."""
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech_segments(samples, sample_rate=16000, frame_ms=FRAME_MS,
+                           margin_db=MARGIN_DB, min_threshold_db=MIN_THRESHOLD_DB,
+                           min_speech_ms=150, min_silence_ms=300, padding_ms=200):
+    """
+    Find speech in a whole recording with an energy detector.
+
+    The noise floor is taken as the 10th percentile of frame energies. Silent
+    gaps shorter than min_silence_ms are bridged, bursts shorter than
+    min_speech_ms are discarded, and each segment is padded so word edges are
+    not clipped.
+
+    Args:
+        samples (np.ndarray): int16 mono samples.
+        sample_rate (int): Sample rate of samples.
+
+    Returns:
+        list[tuple]: (start_sample, end_sample) pairs in order.
+    """
+    frame_len = sample_rate * frame_ms // 1000
+    energies = frame_energies_db(samples, frame_len)
+    if energies.size == 0:
+        return []
+
+    threshold = max(float(np.percentile(energies, 10)) + margin_db, min_threshold_db)
+    speech = energies > threshold
+
+    # Bridge short pauses inside an utterance
+    starts, ends = _runs(~speech)
+    min_gap = max(1, min_silence_ms // frame_ms)
+    for start, end in zip(starts, ends):
+        if end - start < min_gap and start > 0 and end < len(speech):
+            speech[start:end] = True
+
+    # Drop clicks and other short bursts
+    starts, ends = _runs(speech)
+    keep = (ends - starts) >= max(1, min_speech_ms // frame_ms)
+    starts, ends = starts[keep], ends[keep]
+    if starts.size == 0:
+        return []
+
+    pad = padding_ms * sample_rate // 1000
+    segment_starts = np.maximum(starts * frame_len - pad, 0)
+    segment_ends = np.minimum(ends * frame_len + pad, len(samples))
+
+    segments = []
+    for start, end in zip(segment_starts.tolist(), segment_ends.tolist()):
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+class StreamingVAD:
+    """
+    Incremental energy detector for audio that arrives in chunks.
+
+    feed() classifies each frame against a rolling noise floor and returns
+    the audio that should reach the recognizer: speech frames plus a short
+    pre-roll before each onset and a hangover after each offset. Silence in
+    between is dropped. It also tracks how long the input has been silent,
+    which AudioRecorder uses for auto-stop.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=FRAME_MS, margin_db=MARGIN_DB,
+                 min_threshold_db=MIN_THRESHOLD_DB, hangover_ms=300, preroll_ms=200,
+                 history_ms=5000):
+        self.sample_rate = sample_rate
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_len * 2
+        self.margin_db = margin_db
+        self.min_threshold_db = min_threshold_db
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+
+        self.noise_floor_db = None
+        self._history = deque(maxlen=max(1, history_ms // frame_ms))
+        self.in_speech = False
+        self.heard_speech = False
+        self.segments = []
+
+        self._pending = b""
+        self._preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._hangover = 0
+        self._frame_index = 0
+        self._silent_frames = 0
+        self._segment_start = None
+
+    @property
+    def silence_seconds(self):
+        """How long the input has been continuously silent."""
+        return self._silent_frames * self.frame_len / self.sample_rate
+
+    def _update_threshold(self, energies):
+        """
+        Re-estimate the noise floor as the 10th percentile of recent frame
+        energies. Natural pauses between words keep the low percentile near
+        the background level even while someone is talking.
+        """
+        self._history.extend(energies[energies > DIGITAL_SILENCE_DB].tolist())
+        if self._history:
+            self.noise_floor_db = float(np.percentile(np.fromiter(self._history, np.float32), 10))
+        if self.noise_floor_db is None:
+            return self.min_threshold_db
+        return max(self.noise_floor_db + self.margin_db, self.min_threshold_db)
+
+    def feed(self, data):
+        """
+        Process a chunk of int16 mono PCM.
+
+        Returns:
+            list[tuple]: Events in order. ("audio", bytes) is audio to pass
+            on to the recognizer; ("end", (start_s, end_s)) marks the end of
+            a speech segment.
+        """
+        data = self._pending + bytes(data)
+        whole = len(data) - len(data) % self.frame_bytes
+        self._pending = data[whole:]
+        if whole == 0:
+            return []
+
+        energies = frame_energies_db(np.frombuffer(data[:whole], dtype=np.int16), self.frame_len)
+        is_speech = (energies > self._update_threshold(energies)).tolist()
+        events = []
+        for i, speech in enumerate(is_speech):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            self._silent_frames = 0 if speech else self._silent_frames + 1
+
+            if speech:
+                if not self.in_speech:
+                    self.in_speech = True
+                    self.heard_speech = True
+                    self._segment_start = self._frame_index - len(self._preroll)
+                    events.extend(("audio", f) for f in self._preroll)
+                    self._preroll.clear()
+                self._hangover = self.hangover_frames
+                events.append(("audio", frame))
+            elif self.in_speech:
+                events.append(("audio", frame))
+                self._hangover -= 1
+                if self._hangover <= 0:
+                    events.append(("end", self._close_segment(self._frame_index + 1)))
+            else:
+                self._preroll.append(frame)
+
+            self._frame_index += 1
+        return _coalesce(events)
+
+    def _close_segment(self, end_frame):
+        self.in_speech = False
+        segment = (self._segment_start * self.frame_len / self.sample_rate,
+                   end_frame * self.frame_len / self.sample_rate)
+        self.segments.append(segment)
+        return segment
+
+    def flush(self):
+        """Finish the stream, closing any open segment."""
+        events = []
+        if self.in_speech:
+            if self._pending:
+                events.append(("audio", self._pending))
+            events.append(("end", self._close_segment(self._frame_index)))
+        self._pending = b""
+        return events
+
+
+def _coalesce(events):
+    """Merge consecutive audio events so the recognizer gets fewer, larger blocks."""
+    merged = []
+    for kind, payload in events:
+        if kind == "audio" and merged and merged[-1][0] == "audio":
+            merged[-1][1].append(payload)
+        elif kind == "audio":
+            merged.append(("audio", [payload]))
+        else:
+            merged.append((kind, payload))
+    return [(kind, b"".join(payload) if kind == "audio" else payload)
+            for kind, payload in merged]
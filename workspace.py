@@ -0,0 +1,414 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Memory-backed on most Linux systems, so scratch audio never touches disk
+_TMPFS = "/dev/shm"
+
+# Uploads are hashed and copied in blocks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class WorkspaceQuotaError(Exception):
+    """Raised when a file would take a workspace past its size quota."""
+
+
+def default_root():
+    """
+    Directory that holds every session workspace: $SPEECH_WORKSPACE_DIR if
+    set, else a subdirectory of /dev/shm when it is writable, else of the
+    system temp directory.
+    """
+    root = os.environ.get("SPEECH_WORKSPACE_DIR")
+    if root:
+        return root
+    base = _TMPFS if os.path.isdir(_TMPFS) and os.access(_TMPFS, os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "speech_workspaces")
+
+
+def _dir_usage(path):
+    """Return (total_bytes, [(mtime, size, file_path), ...]) for files in path."""
+    total = 0
+    files = []
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return 0, files
+    for entry in entries:
+        try:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                total += stat.st_size
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+    return total, files
+
+
+class FileLeases:
+    """
+    Reference counts of files in use, e.g. by a transcription job, shared by
+    the workspaces of one manager so its janitor leaves those files alone.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+
+    def release(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            count = self._counts.get(path, 0) - 1
+            if count > 0:
+                self._counts[path] = count
+            else:
+                self._counts.pop(path, None)
+
+    def remove_unless_leased(self, path):
+        """
+        Delete path if nobody holds a lease on it, atomically with respect
+        to acquire(). Returns whether it was deleted.
+        """
+        with self._lock:
+            if os.path.abspath(path) in self._counts:
+                return False
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def __contains__(self, path):
+        with self._lock:
+            return os.path.abspath(path) in self._counts
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Workspace:
+    """
+    Scratch directory owned by one user session.
+
+    Every file gets a unique name, so sessions acting in the same second
+    cannot overwrite each other's audio, and clear() only ever touches this
+    session's directory. Files handed to work that outlives the current
+    request should be leased, so the janitor does not evict them meanwhile.
+    """
+
+    def __init__(self, path, max_bytes, leases=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.leases = leases if leases is not None else FileLeases()
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def lease(self, path):
+        """Keep the janitor away from path until release(path)."""
+        self.leases.acquire(path)
+
+    def release(self, path):
+        """Drop a lease taken with lease()."""
+        self.leases.release(path)
+
+    def touch(self):
+        """Mark the workspace as in use so the janitor keeps it."""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            os.makedirs(self.path, exist_ok=True)
+
+    def new_path(self, prefix, suffix=""):
+        """
+        Return a fresh, unused file path such as
+        recording_20240101_120000_1a2b3c4d.wav inside the workspace.
+        """
+        self.touch()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return os.path.join(self.path, f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}{suffix}")
+
+    def usage(self):
+        """Bytes currently stored in the workspace."""
+        return _dir_usage(self.path)[0]
+
+    def ensure_room(self, size):
+        """
+        Check that size more bytes fit in the quota.
+
+        Raises:
+            WorkspaceQuotaError: If they do not.
+        """
+        used = self.usage()
+        if used + size > self.max_bytes:
+            raise self._quota_error(used)
+
+    def _quota_error(self, used):
+        return WorkspaceQuotaError(
+            f"Workspace is full ({used / 2**20:.1f} of {self.max_bytes / 2**20:.0f} MB used). "
+            f"Clear old recordings and try again."
+        )
+
+    def save_upload(self, name, data, size=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        """
+        Store an uploaded file, named after a hash of its content.
+
+        The upload is copied in chunk_size blocks, so saving it needs no
+        buffer beyond one block. Content already in memory (such as a
+        Streamlit UploadedFile) stays there for as long as its owner keeps
+        it. If this workspace already holds the same content, the stored
+        file is reused and nothing is written. Deduplication is per
+        session: other sessions' workspaces are not searched, so two
+        sessions uploading the same file each store a copy.
+
+        Args:
+            name (str): Original file name; only its extension is kept.
+            data: bytes-like object, or a file-like object to copy from.
+            size (int): Size in bytes if data is a stream that cannot seek,
+                to refuse an upload that will not fit before reading it.
+            chunk_size (int): Bytes read and written at a time.
+
+        Returns:
+            str: Path of the stored file.
+
+        Raises:
+            WorkspaceQuotaError: If the upload does not fit in the quota.
+        """
+        suffix = os.path.splitext(name)[1].lower()
+        if not hasattr(data, "read"):
+            view = memoryview(data).cast("B")
+
+            def blocks():
+                return (view[i:i + chunk_size] for i in range(0, len(view), chunk_size))
+        elif data.seekable():
+            start = data.tell()
+
+            def blocks():
+                data.seek(start)
+                return iter(lambda: data.read(chunk_size), b"")
+        else:
+            return self._save_stream(suffix, data, size, chunk_size)
+
+        # Hash first, so content that is already stored is never rewritten
+        digest = hashlib.sha256()
+        size = 0
+        for block in blocks():
+            digest.update(block)
+            size += len(block)
+        path = self._content_path(digest.hexdigest(), suffix)
+
+        with self._lock:
+            if self._reuse(path):
+                return path
+            self.ensure_room(size)
+            partial = self.new_path("partial", ".part")
+            try:
+                with open(partial, "wb") as f:
+                    for block in blocks():
+                        f.write(block)
+                os.replace(partial, path)
+            except BaseException:
+                _remove(partial)
+                raise
+        return path
+
+    def _save_stream(self, suffix, stream, size, chunk_size):
+        """save_upload() for a stream that can only be read once."""
+        with self._lock:
+            used = self.usage()
+            if size is not None and used + size > self.max_bytes:
+                raise self._quota_error(used)
+            digest = hashlib.sha256()
+            written = 0
+            partial = self.new_path("partial", ".part")
+            try:
+                with open(partial, "wb") as f:
+                    for block in iter(lambda: stream.read(chunk_size), b""):
+                        written += len(block)
+                        if used + written > self.max_bytes:
+                            raise self._quota_error(used)
+                        digest.update(block)
+                        f.write(block)
+                path = self._content_path(digest.hexdigest(), suffix)
+                if self._reuse(path):
+                    _remove(partial)
+                else:
+                    os.replace(partial, path)
+            except BaseException:
+                _remove(partial)
+                raise
+        return path
+
+    def _content_path(self, hex_digest, suffix):
+        return os.path.join(self.path, f"uploaded_{hex_digest[:32]}{suffix}")
+
+    def _reuse(self, path):
+        """Keep an already stored copy of path alive. Caller holds the lock."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self.touch()
+        return True
+
+    def owns(self, path):
+        """Whether path is inside this workspace."""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.path)
+
+    def clear(self):
+        """Delete this session's files and nothing else."""
+        _, files = _dir_usage(self.path)
+        for _, _, path in files:
+            _remove(path)
+
+    def remove(self):
+        """Delete the workspace directory itself."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class WorkspaceManager:
+    """
+    Creates session workspaces under one root and keeps their total size
+    bounded.
+
+    A janitor thread periodically deletes files older than max_age and,
+    while the root still holds more than max_total_bytes, the oldest files
+    across all sessions. Leased files and partial files still being written
+    are never evicted. Workspace directories left idle for max_age (e.g. by
+    a closed browser tab) are removed entirely.
+    """
+
+    def __init__(self, root=None, session_max_bytes=200 * 2**20, max_total_bytes=2 * 2**30,
+                 max_age=6 * 3600, janitor_interval=60):
+        self.root = root or default_root()
+        self.session_max_bytes = session_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age
+        self.janitor_interval = janitor_interval
+        os.makedirs(self.root, exist_ok=True)
+
+        self._stop = threading.Event()
+        self._janitor = None
+        self._lock = threading.Lock()
+        self.leases = FileLeases()
+        self.files_evicted = 0
+        self.bytes_evicted = 0
+
+    def create(self):
+        """Create a new, empty workspace for one session."""
+        return Workspace(os.path.join(self.root, uuid.uuid4().hex), self.session_max_bytes,
+                         self.leases)
+
+    def start_janitor(self):
+        """Start the background cleanup thread if it is not running."""
+        with self._lock:
+            if self._janitor is None or not self._janitor.is_alive():
+                self._stop.clear()
+                self._janitor = threading.Thread(target=self._run_janitor,
+                                                 name="workspace-janitor", daemon=True)
+                self._janitor.start()
+
+    def stop_janitor(self):
+        self._stop.set()
+
+    def _run_janitor(self):
+        while not self._stop.wait(self.janitor_interval):
+            try:
+                self.clean()
+            except Exception as e:
+                print(f"Error cleaning workspaces: {e}")
+
+    def clean(self, now=None):
+        """
+        Run one cleanup pass.
+
+        Returns:
+            int: Bytes still stored under the root afterwards.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.max_age
+        files = []
+        total = 0
+
+        for entry in list(os.scandir(self.root)):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            size, session_files = _dir_usage(entry.path)
+            for mtime, file_size, path in session_files:
+                if mtime < cutoff:
+                    if self._evict(path, file_size):
+                        size -= file_size
+                elif not path.endswith(".part"):
+                    # Partial files are still being written; only age removes them
+                    files.append((mtime, file_size, path))
+            total += size
+
+            try:
+                idle = entry.stat().st_mtime < cutoff
+                if idle and size == 0:
+                    os.rmdir(entry.path)
+            except OSError:
+                # Gained a file since the scan, or already removed
+                pass
+
+        # Over the global budget: evict the oldest files first
+        files.sort()
+        for mtime, file_size, path in files:
+            if total <= self.max_total_bytes:
+                break
+            if self._evict(path, file_size):
+                total -= file_size
+        return total
+
+    def _evict(self, path, size):
+        """Delete path unless it is leased. Returns whether it was deleted."""
+        if not self.leases.remove_unless_leased(path):
+            return False
+        with self._lock:
+            self.files_evicted += 1
+            self.bytes_evicted += size
+        return True
+
+    def stats(self):
+        """Return total usage and eviction counters."""
+        total = sessions = 0
+        for entry in os.scandir(self.root):
+            if entry.is_dir(follow_symlinks=False):
+                sessions += 1
+                total += _dir_usage(entry.path)[0]
+        with self._lock:
+            return {
+                "root": self.root,
+                "sessions": sessions,
+                "total_bytes": total,
+                "max_total_bytes": self.max_total_bytes,
+                "files_evicted": self.files_evicted,
+                "bytes_evicted": self.bytes_evicted,
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager():
+    """Return the process-wide workspace manager, starting its janitor."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager()
+            _manager.start_janitor()
+        return _manager